@@ -1,7 +1,42 @@
 import streamlit as st
+import pandas as pd
+import auth
 import database as db
 from datetime import datetime
 
+def show_replica_status():
+    """Show how old the analytics read replica is, when one is in use"""
+    status = db.get_replica_status()
+    if status is None:
+        return
+    if status["error"]:
+        st.warning(f"Analytics replica refresh failed: {status['error']}")
+    st.caption(f"Counts and snapshots are read from a copy refreshed every {status['refresh_seconds']}s; "
+               f"last refreshed {status['refreshed_at']:%H:%M:%S} ({status['age_seconds']:.0f}s ago).")
+
+
+def show_group_overview():
+    """Display the pipeline of every business unit side by side"""
+    st.subheader("Group Overview")
+    tenants = db.get_tenants()
+    statuses = ["Connected", "Technical Analysis", "Price Offered", "Won", "Completed", "Lost"]
+    
+    rows = {}
+    for key, status, count, value in db.get_group_pipeline_summary():
+        row = rows.setdefault(key, {"Company": tenants[key]["name"], "Leads": 0, "Offered Value (BDT)": 0.0})
+        row[status] = count
+        row["Leads"] += count
+        row["Offered Value (BDT)"] += value
+    
+    if not rows:
+        st.info("No company databases found")
+        return
+    
+    df = pd.DataFrame(list(rows.values()), columns=["Company"] + statuses + ["Leads", "Offered Value (BDT)"])
+    df[statuses] = df[statuses].fillna(0).astype(int)
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+
 def main():
     st.set_page_config(
         page_title="CRM System",
@@ -10,8 +45,8 @@ def main():
         initial_sidebar_state="expanded"
     )
     
-    # Initialize database
-    db.init_database()
+    user = auth.require_login()
+    scope = auth.get_scope(user)
     
     st.title("📊 CRM Management System")
     st.markdown("""
@@ -33,18 +68,14 @@ def main():
     col1, col2, col3, col4 = st.columns(4)
     
     try:
-        # Get overview statistics
-        all_leads = db.get_all_leads()
+        # Get overview statistics (from the read replica when it is enabled)
+        status_counts = db.get_lead_status_counts(scope=scope)
         all_employees = db.get_all_employees()
         all_customers = db.get_all_customers()
-        
-        connected_leads = db.get_leads_by_status("Connected")
-        technical_leads = db.get_leads_by_status("Technical Analysis")
-        price_offered_leads = db.get_leads_by_status("Price Offered")
-        won_leads = db.get_leads_by_status("Won")
+        won_count = db.get_lead_status_counts(scope=scope, include_archive=True).get("Won", 0)
         
         with col1:
-            st.metric("Total Leads", len(all_leads))
+            st.metric("Total Leads", sum(status_counts.values()))
         
         with col2:
             st.metric("Total Customers", len(all_customers))
@@ -53,7 +84,7 @@ def main():
             st.metric("Total Employees", len(all_employees))
         
         with col4:
-            st.metric("Won Deals", len(won_leads))
+            st.metric("Won Deals", won_count)
     except:
         st.warning("Please ensure master data is set up first")
     
@@ -65,10 +96,10 @@ def main():
     try:
         with col1:
             st.subheader("Lead Status Summary")
-            st.write(f"🔗 Connected: {len(connected_leads)}")
-            st.write(f"🔍 Technical Analysis: {len(technical_leads)}")
-            st.write(f"💰 Price Offered: {len(price_offered_leads)}")
-            st.write(f"✅ Won: {len(won_leads)}")
+            st.write(f"🔗 Connected: {status_counts.get('Connected', 0)}")
+            st.write(f"🔍 Technical Analysis: {status_counts.get('Technical Analysis', 0)}")
+            st.write(f"💰 Price Offered: {status_counts.get('Price Offered', 0)}")
+            st.write(f"✅ Won: {won_count}")
         
         with col2:
             st.subheader("Quick Actions")
@@ -82,7 +113,7 @@ def main():
         with col3:
             st.subheader("Upcoming Follow-ups")
             today = datetime.today().date()
-            followup_leads = db.get_leads_needing_followup(today)
+            followup_leads = db.get_leads_needing_followup(today, scope=scope)
             if followup_leads:
                 st.warning(f"⚠️ {len(followup_leads)} leads need follow-up")
                 for lead in followup_leads[:5]:
@@ -96,6 +127,30 @@ def main():
     
     st.divider()
     
+    # Point-in-time pipeline, rebuilt from the nearest checkpoint
+    st.subheader("Pipeline Snapshot")
+    today = datetime.today().date()
+    as_of = st.date_input("Pipeline as of", value=today, max_value=today)
+    db.maybe_take_pipeline_checkpoint()
+    pipeline = db.get_pipeline_as_of(as_of, scope=scope)
+    
+    statuses = ["Connected", "Technical Analysis", "Price Offered", "Won", "Completed", "Lost"]
+    cols = st.columns(len(statuses))
+    for col, status in zip(cols, statuses):
+        count, value = pipeline.get(status, (0, 0.0))
+        with col:
+            st.metric(status, count)
+            st.caption(f"BDT {value:,.0f}")
+    
+    show_replica_status()
+    
+    st.divider()
+    
+    # Group-wide view across all business units, read through ATTACH
+    if len(db.get_tenants()) > 1 and auth.is_admin(user):
+        show_group_overview()
+        st.divider()
+    
     st.subheader("System Information")
     st.markdown("""
     **Navigation:**
@@ -104,7 +159,7 @@ def main():
     3. **Lead Tracking** - Monitor and update lead status and follow-ups
     
     **Key Features:**
-    - Automatic serial number generation for offers (XBL format)
+    - Automatic serial number generation for offers (prefix per company, e.g. XBL)
     - Offer revision tracking (R1, R2, R3...)
     - Follow-up reminders and scheduling
     - Priority and status management
@@ -0,0 +1,115 @@
+"""Content-addressed file store for lead attachments.
+
+Each file is stored once, named after its SHA-256 hash:
+
+    attachments/ab/abcdef0123...
+
+Uploading the same document to several leads only adds metadata rows to the
+lead_attachments table. With several business units each one has its own
+store under attachments/<unit>/, since their metadata lives in separate
+database files. Keeping the files out of crm_database.db stops large
+documents from bloating backups and the database page cache.
+"""
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+
+import database as db
+
+ATTACHMENT_DIR = os.environ.get("CRM_ATTACHMENT_DIR", "attachments")
+CHUNK_SIZE = 1024 * 1024
+
+# Held while a file is stored and recorded, and while a record is deleted and
+# its file removed, so an upload of the same content cannot be recorded
+# against a file that a concurrent delete is about to remove
+_store_lock = threading.Lock()
+
+
+def get_attachment_dir():
+    """Get the store directory of the current business unit"""
+    tenant = db.get_tenant()
+    return os.path.join(ATTACHMENT_DIR, tenant) if tenant else ATTACHMENT_DIR
+
+
+def get_blob_path(sha256):
+    """Get the path of a stored file from its hash"""
+    return os.path.join(get_attachment_dir(), sha256[:2], sha256)
+
+
+def store_file(file_obj):
+    """Stream a file object into the store in chunks; return (sha256, size)"""
+    attachment_dir = get_attachment_dir()
+    os.makedirs(attachment_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    # Write to a temp file in the same directory so the final rename is atomic
+    fd, tmp_path = tempfile.mkstemp(dir=attachment_dir, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            while True:
+                chunk = file_obj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+
+        sha256 = digest.hexdigest()
+        blob_path = get_blob_path(sha256)
+        if os.path.exists(blob_path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(tmp_path, blob_path)
+        return sha256, size
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def add_attachment(lead_id, file_obj, filename, content_type=None, uploaded_by=None):
+    """Store a file and attach it to a lead"""
+    with _store_lock:
+        try:
+            sha256, size = store_file(file_obj)
+        except OSError as e:
+            return False, str(e)
+        return db.add_lead_attachment(lead_id, sha256, filename, size, content_type, uploaded_by)
+
+
+def read_attachment(attachment_id):
+    """Get an attachment's metadata and contents, read through a memory map.
+
+    The contents are None when the stored file is missing from the store.
+    """
+    attachment = db.get_attachment(attachment_id)
+    if not attachment:
+        return None, None
+
+    sha256 = attachment[5]
+    try:
+        f = open(get_blob_path(sha256), "rb")
+    except FileNotFoundError:
+        return attachment, None
+    with f:
+        if attachment[3] == 0:
+            return attachment, b""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return attachment, mapped[:]
+
+
+def delete_attachment(attachment_id):
+    """Detach a file from a lead and remove it from the store once nothing uses it"""
+    with _store_lock:
+        unused_sha256 = db.delete_lead_attachment(attachment_id)
+        # Check again right before removing: another server process may have
+        # recorded the same file since the delete committed
+        if unused_sha256 and not db.is_attachment_file_used(unused_sha256):
+            try:
+                os.remove(get_blob_path(unused_sha256))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,114 @@
+"""Login and role-based visibility for the Streamlit pages.
+
+Roles:
+    rep        sees leads assigned to or followed up by themselves
+    team_lead  sees leads of everyone in their team
+    admin      sees everything and manages employees and users
+
+Visibility is enforced inside the database.py queries through a scope
+(a tuple of employee names, or None for everything), not by filtering
+result sets in the pages.
+"""
+import hashlib
+import hmac
+import os
+
+import streamlit as st
+
+import database as db
+
+PBKDF2_ITERATIONS = 200_000
+
+
+def hash_password(password, salt=None):
+    """Hash a password as pbkdf2_sha256$<iterations>$<salt>$<hash>"""
+    salt = salt or os.urandom(16).hex()
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt}${digest.hex()}"
+
+
+def verify_password(password, password_hash):
+    """Check a password against a stored hash"""
+    try:
+        _, iterations, salt, expected = password_hash.split("$")
+    except ValueError:
+        return False
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), int(iterations))
+    return hmac.compare_digest(digest.hex(), expected)
+
+
+def authenticate(username, password):
+    """Get the user for valid credentials, else None"""
+    user = db.get_user(username)
+    if user and verify_password(password, user["password_hash"]):
+        return {"username": user["username"], "role": user["role"], "employee_name": user["employee_name"],
+                "tenant": db.get_tenant()}
+    return None
+
+
+def get_scope(user):
+    """Get the visibility scope to pass to the lead queries"""
+    return db.get_visibility_scope(user["role"], user["employee_name"])
+
+
+def is_admin(user):
+    return user["role"] == "admin"
+
+
+def _show_login_form():
+    with st.form("login_form"):
+        username = st.text_input("Username")
+        password = st.text_input("Password", type="password")
+        submitted = st.form_submit_button("Log in", type="primary")
+
+        if submitted:
+            user = authenticate(username, password)
+            if user:
+                st.session_state.user = user
+                st.rerun()
+            else:
+                st.error("Invalid username or password")
+
+
+def _select_tenant(user):
+    """Route this session's database calls to its business unit.
+
+    Users pick the company on the login form; once logged in they stay on the
+    company whose users table they logged in to.
+    """
+    tenants = db.get_tenants()
+    if not tenants:
+        return
+    if user:
+        key = user.get("tenant")
+    else:
+        key = st.sidebar.selectbox("Company", list(tenants), format_func=lambda k: tenants[k]["name"])
+    db.set_tenant(key)
+
+
+def require_login():
+    """Get the logged-in user, showing the login form and stopping the page if there is none"""
+    user = st.session_state.get("user")
+    # Bootstrap only once the session is on its business unit's file
+    _select_tenant(user)
+    db.ensure_database()
+    if user:
+        with st.sidebar:
+            if user.get("tenant"):
+                st.write(f"🏢 **{db.get_tenants()[user['tenant']]['name']}**")
+            st.write(f"👤 **{user['username']}** ({user['role'].replace('_', ' ')})")
+            if st.button("Log out"):
+                del st.session_state.user
+                st.rerun()
+        return user
+
+    st.header("Log in")
+    if db.get_all_users():
+        _show_login_form()
+    else:
+        # Anyone can reach the login form, so the first administrator is
+        # created on the server rather than by whoever loads the app first
+        tenant_option = f"--tenant {db.get_tenant()} " if db.get_tenant() else ""
+        st.info("No users exist yet. An administrator creates the first account on the server with "
+                f"`python manage.py {tenant_option}create-admin <username>`.")
+    st.stop()
@@ -1,13 +1,234 @@
+import contextvars
+import copy
+import functools
+import itertools
+import json
+import math
+import os
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 DB_PATH = "crm_database.db"
+SERIAL_PREFIX = "XBL"
+
+# Optional list of business units, each with its own database file and serial
+# prefix: {"xbl": {"name": "XBL Energy", "db_path": "xbl.db", "serial_prefix": "XBL"}}.
+# Without the file there is one unit using DB_PATH and SERIAL_PREFIX.
+TENANTS_FILE = os.environ.get("CRM_TENANTS_FILE", "tenants.json")
+
+# Closed leads whose whole offer has been untouched this long are moved out of
+# the hot leads table by archive_closed_leads()
+CLOSED_STATUSES = ("Won", "Lost", "Completed")
+ARCHIVE_AFTER_DAYS = int(os.environ.get("CRM_ARCHIVE_AFTER_DAYS", 365))
+
+# maybe_take_pipeline_checkpoint() takes a new checkpoint once the last one is
+# this old, so an "as of" query replays at most this many days of history
+CHECKPOINT_INTERVAL_DAYS = int(os.environ.get("CRM_CHECKPOINT_INTERVAL_DAYS", 7))
+PIPELINE_FIELDS = ("status", "offered_value", "priority", "is_latest",
+                   "project_category", "assigned_sales_person", "follow_up_by")
+
+# Lead score of an open offer (0-100), see compute_lead_score(). Changing one
+# of SCORE_FIELDS through update_lead() rescores the offer at once; the
+# date-dependent parts are refreshed once a day.
+SCORE_FIELDS = ("status", "offered_value", "follow_up_date", "next_follow_up_date",
+                "assigned_sales_person", "project_category")
+SCORE_STATUS_POINTS = {"Connected": 5, "Technical Analysis": 15, "Price Offered": 25}
+SCORE_VALUE_POINTS = 30          # log scale from SCORE_VALUE_FLOOR to 10,000x that
+SCORE_VALUE_FLOOR = 10_000
+SCORE_WIN_RATE_POINTS = 20       # times the category's win rate
+SCORE_STALE_POINTS = 10          # one point per 3 days since the last follow-up
+SCORE_OVERDUE_POINTS = 15        # 10 once overdue, up to 5 more by weeks overdue
+
+# Bump whenever init_database() gains new tables, columns or indexes so that
+# ensure_database() re-runs the bootstrap on existing database files.
+SCHEMA_VERSION = 15
+
+# Tables whose writes bump a counter in table_versions. "customer_names" is not
+# a real table: it only moves when a customer is added, removed or renamed,
+# which is all that lead listings read from customers. "leads_archive" is
+# bumped by archive_closed_leads(), since the archive file has no triggers.
+TRACKED_TABLES = ("employees", "customers", "project_categories", "projects", "leads", "lead_attachments", "users",
+                  "saved_views", "report_jobs", "lead_scores")
+USER_ROLES = ("rep", "team_lead", "admin")
+QUERY_CACHE_SIZE = 256
+
+_bootstrapped_paths = set()
+_bootstrap_lock = threading.Lock()
+_query_cache = {}
+_query_cache_lock = threading.Lock()
+_tenants = None
+_replicas = {}
+_replica_lock = threading.Lock()
+_replica_start_lock = threading.Lock()
+_replica_counter = itertools.count(1)
+# Optional in-memory read replica for analytic queries (dashboard, Customer
+# 360, pipeline as of a date), refreshed from the database file every this
+# many seconds. 0 turns it off and every query reads the file.
+REPLICA_REFRESH_SECONDS = int(os.environ.get("CRM_REPLICA_REFRESH_SECONDS", 0))
+
+# SQLite's default limit on attached databases per connection
+MAX_ATTACHED = 10
+# A context variable rather than a global so that concurrent Streamlit
+# sessions (one thread each) can work on different business units
+_current_tenant = contextvars.ContextVar("crm_tenant", default=None)
+
+
+def get_tenants():
+    """Get {key: settings} for every business unit in TENANTS_FILE ({} without one)"""
+    global _tenants
+    if _tenants is None:
+        tenants = {}
+        if os.path.exists(TENANTS_FILE):
+            with open(TENANTS_FILE) as f:
+                tenants = json.load(f)
+            for key, tenant in tenants.items():
+                tenant.setdefault("name", key)
+                tenant.setdefault("db_path", f"crm_{key}.db")
+                tenant.setdefault("serial_prefix", key.upper())
+        _tenants = tenants
+    return _tenants
+
+
+def set_tenant(key):
+    """Route this thread's database calls to a business unit (None for DB_PATH)"""
+    if key is not None and key not in get_tenants():
+        raise ValueError(f"Unknown tenant: {key}")
+    _current_tenant.set(key)
+
+
+def get_tenant():
+    """Get the business unit this thread's database calls go to, or None"""
+    return _current_tenant.get()
+
+
+def get_db_path():
+    """Get the database file of the current business unit"""
+    key = _current_tenant.get()
+    return get_tenants()[key]["db_path"] if key else DB_PATH
+
+
+def get_serial_prefix():
+    """Get the serial number prefix of the current business unit"""
+    key = _current_tenant.get()
+    return get_tenants()[key]["serial_prefix"] if key else SERIAL_PREFIX
 
 
 def get_connection():
     """Get database connection"""
-    return sqlite3.connect(DB_PATH)
+    return sqlite3.connect(get_db_path())
+
+
+def _refresh_replica(db_path):
+    """Copy db_path into a new in-memory database and switch readers over to it.
+
+    Each copy is a named shared-cache memory database kept alive by an anchor
+    connection. Readers connect under _replica_lock, so none can open the
+    previous copy after the swap; those already on it finish there and it is
+    freed when the last of them closes.
+    """
+    started = time.perf_counter()
+    uri = f"file:crm_replica_{next(_replica_counter)}?mode=memory&cache=shared"
+    anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    source = sqlite3.connect(db_path)
+    try:
+        source.backup(anchor)
+    finally:
+        source.close()
+
+    with _replica_lock:
+        previous = _replicas.get(db_path)
+        _replicas[db_path] = {
+            "uri": uri,
+            "anchor": anchor,
+            "generation": previous["generation"] + 1 if previous else 1,
+            "refreshed_at": time.time(),
+            "refresh_ms": (time.perf_counter() - started) * 1000,
+            "error": None,
+        }
+    if previous:
+        previous["anchor"].close()
+
+
+def _run_replica_refresher(db_path):
+    while True:
+        time.sleep(REPLICA_REFRESH_SECONDS)
+        try:
+            _refresh_replica(db_path)
+        except Exception as e:
+            # Keep serving the previous copy; the error shows in get_replica_status()
+            with _replica_lock:
+                _replicas[db_path]["error"] = str(e)
+
+
+def _get_replica(db_path):
+    """Get the replica of db_path, loading it and starting its refresher on first use"""
+    replica = _replicas.get(db_path)
+    if replica is not None:
+        return replica
+    with _replica_start_lock:
+        if db_path not in _replicas:
+            _refresh_replica(db_path)
+            threading.Thread(target=_run_replica_refresher, args=(db_path,), daemon=True,
+                             name=f"crm-replica-{db_path}").start()
+    return _replicas[db_path]
+
+
+def get_read_connection():
+    """Get a connection for analytic reads: the in-memory replica when enabled, else the database file.
+
+    Only use it for queries that can be up to REPLICA_REFRESH_SECONDS stale,
+    and never for writes.
+    """
+    if not REPLICA_REFRESH_SECONDS:
+        return get_connection()
+    db_path = get_db_path()
+    _get_replica(db_path)
+    # Connect under the lock: the refresher closes the previous copy's anchor
+    # right after swapping, and connecting to a copy nobody holds open any
+    # more would create a new, empty memory database.
+    with _replica_lock:
+        return sqlite3.connect(_replicas[db_path]["uri"], uri=True)
+
+
+def get_replica_status():
+    """Get the replica's age and last refresh time, or None when it is off or not loaded yet"""
+    if not REPLICA_REFRESH_SECONDS:
+        return None
+    replica = _replicas.get(get_db_path())
+    if replica is None:
+        return None
+    return {
+        "refreshed_at": datetime.fromtimestamp(replica["refreshed_at"]),
+        "age_seconds": time.time() - replica["refreshed_at"],
+        "refresh_seconds": REPLICA_REFRESH_SECONDS,
+        "refresh_ms": replica["refresh_ms"],
+        "error": replica["error"],
+    }
+
+
+def _replica_generation():
+    """Get the current replica copy's number (None when reads go to the file)"""
+    if not REPLICA_REFRESH_SECONDS:
+        return None
+    return _get_replica(get_db_path())["generation"]
+
+
+def get_archive_path():
+    """Get the path of the archive database that belongs to the current database"""
+    path = Path(get_db_path())
+    return str(path.with_name(f"{path.stem}_archive{path.suffix}"))
+
+
+def _attach_archive(conn):
+    """Attach the archive database as "archive" if it exists; return whether it was attached"""
+    archive_path = get_archive_path()
+    if not os.path.exists(archive_path):
+        return False
+    conn.execute('ATTACH DATABASE ? AS archive', (archive_path,))
+    return True
 
 
 def init_database():
@@ -83,23 +304,406 @@ def init_database():
             serial_number TEXT UNIQUE,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (customer_id) REFERENCES customers(id)
+            revision INTEGER,
+            parent_lead_id INTEGER,
+            is_latest INTEGER NOT NULL DEFAULT 1,
+            FOREIGN KEY (customer_id) REFERENCES customers(id),
+            FOREIGN KEY (parent_lead_id) REFERENCES leads(id)
+        )
+    ''')
+
+    # Revision lineage: numeric revision, parent link and latest-revision flag
+    # (added to databases created before these columns existed)
+    _add_column_if_missing(cursor, "leads", "revision", "INTEGER")
+    _add_column_if_missing(cursor, "leads", "parent_lead_id", "INTEGER REFERENCES leads(id)")
+    _add_column_if_missing(cursor, "leads", "is_latest", "INTEGER NOT NULL DEFAULT 1")
+
+    # Offer lineage per customer. The trailing columns make it a covering
+    # index for the customer summary, so that query never reads the table.
+    # Created before the backfills below so their lookups of newer revisions
+    # are index searches rather than table scans.
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_leads_customer_offers
+        ON leads(customer_id, project_category, initial_offer_number, revision,
+                 is_latest, status, offered_value, follow_up_date, next_follow_up_date,
+                 assigned_sales_person, follow_up_by)
+    ''')
+    cursor.execute('DROP INDEX IF EXISTS idx_leads_lineage')
+
+    cursor.execute('''
+        UPDATE leads SET revision = CAST(SUBSTR(offer_revision_number, 2) AS INTEGER)
+        WHERE revision IS NULL
+    ''')
+    cursor.execute('''
+        UPDATE leads SET is_latest = 0
+        WHERE is_latest = 1 AND EXISTS (
+            SELECT 1 FROM leads newer
+            WHERE newer.customer_id = leads.customer_id
+            AND newer.project_category = leads.project_category
+            AND newer.initial_offer_number = leads.initial_offer_number
+            AND newer.revision > leads.revision
+        )
+    ''')
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_leads_parent ON leads(parent_lead_id)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_leads_latest_created
+        ON leads(created_at) WHERE is_latest = 1
+    ''')
+
+    # Listing indexes; plancheck.py fails if a listing stops using them
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_leads_created ON leads(created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_leads_status ON leads(status, created_at)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_leads_latest_status
+        ON leads(status, created_at) WHERE is_latest = 1
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_leads_latest_next_follow_up
+        ON leads(next_follow_up_date) WHERE is_latest = 1
+    ''')
+
+    # Only the newest revision of each offer; used by listings and the dashboard
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS latest_leads AS
+        SELECT * FROM leads WHERE is_latest = 1
+    ''')
+
+    # Login accounts. Reps and team leads are linked to an employee; what they
+    # can see is derived from that employee's name and team.
+    _add_column_if_missing(cursor, "employees", "team", "TEXT")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'rep',
+            employee_name TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_team ON employees(team)')
+
+    # Named lead filters saved by each user on the Lead Tracking page
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS saved_views (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            name TEXT NOT NULL,
+            filters TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(username, name)
+        )
+    ''')
+
+    # Visibility filters on assigned_sales_person / follow_up_by
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_leads_assigned
+        ON leads(assigned_sales_person, created_at)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_leads_follow_up_by
+        ON leads(follow_up_by, created_at)
+    ''')
+
+    # Attachment metadata; the files themselves live in the attachments store
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS lead_attachments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lead_id INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            content_type TEXT,
+            uploaded_by TEXT,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (lead_id) REFERENCES leads(id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_lead_attachments_lead ON lead_attachments(lead_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_lead_attachments_sha256 ON lead_attachments(sha256)')
+
+    # Change feed for downstream sync: one row per insert, update or delete
+    # of a lead, in commit order. seq is the consumer's watermark.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS lead_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            lead_id INTEGER NOT NULL,
+            operation TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_leads_{event.lower()}_change
+            AFTER {event} ON leads
+            BEGIN
+                INSERT INTO lead_changes (lead_id, operation) VALUES ({row}.id, '{event.lower()}');
+            END
+        ''')
+
+    # Pipeline history: the pipeline fields of a lead after every change, plus
+    # periodic checkpoints of the whole pipeline to replay from
+    history_columns = ", ".join(PIPELINE_FIELDS)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS lead_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lead_id INTEGER NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            status TEXT,
+            offered_value REAL,
+            priority TEXT,
+            is_latest INTEGER,
+            project_category TEXT,
+            assigned_sales_person TEXT,
+            follow_up_by TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_lead_history_changed ON lead_history(changed_at)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pipeline_checkpoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            taken_at TIMESTAMP NOT NULL,
+            history_id INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pipeline_checkpoints_taken ON pipeline_checkpoints(taken_at)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pipeline_checkpoint_leads (
+            checkpoint_id INTEGER NOT NULL,
+            lead_id INTEGER NOT NULL,
+            status TEXT,
+            offered_value REAL,
+            priority TEXT,
+            is_latest INTEGER,
+            project_category TEXT,
+            assigned_sales_person TEXT,
+            follow_up_by TEXT,
+            PRIMARY KEY (checkpoint_id, lead_id)
+        ) WITHOUT ROWID
+    ''')
+
+    # Leads that predate the history table are recorded as of their creation
+    cursor.execute(f'''
+        INSERT INTO lead_history (lead_id, changed_at, {history_columns})
+        SELECT id, created_at, {history_columns} FROM leads
+        WHERE NOT EXISTS (SELECT 1 FROM lead_history)
+    ''')
+
+    new_values = ", ".join(f"NEW.{field}" for field in PIPELINE_FIELDS)
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_leads_insert_history
+        AFTER INSERT ON leads
+        BEGIN
+            INSERT INTO lead_history (lead_id, {history_columns}) VALUES (NEW.id, {new_values});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_leads_update_history
+        AFTER UPDATE OF {history_columns} ON leads
+        BEGIN
+            INSERT INTO lead_history (lead_id, {history_columns}) VALUES (NEW.id, {new_values});
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_leads_delete_history
+        AFTER DELETE ON leads
+        BEGIN
+            INSERT INTO lead_history (lead_id, deleted) VALUES (OLD.id, 1);
+        END
+    ''')
+
+    # Background report-pack jobs run by reports.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS report_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            requested_by TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            path TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_report_jobs_requested_by ON report_jobs(requested_by)')
+
+    # Scores of open offers (latest revision only) for the per-rep work queue.
+    # Kept out of the leads table so the daily refresh does not rewrite lead
+    # rows, fill the change feed or invalidate every cached lead listing.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS lead_scores (
+            lead_id INTEGER PRIMARY KEY,
+            assigned_sales_person TEXT NOT NULL,
+            score REAL NOT NULL,
+            scored_on DATE NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lead_scores_queue
+        ON lead_scores(assigned_sales_person, score DESC)
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_lead_scores_scored_on ON lead_scores(scored_on)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS category_win_rates (
+            project_category TEXT PRIMARY KEY,
+            won INTEGER NOT NULL,
+            closed INTEGER NOT NULL,
+            win_rate REAL NOT NULL
+        )
+    ''')
+
+    # Follow-up digests already emailed, one per person per day
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reminder_digests_sent (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_name TEXT NOT NULL,
+            digest_date DATE NOT NULL,
+            lead_count INTEGER NOT NULL,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(digest_date, employee_name)
+        )
+    ''')
+
+    # Change counters used by cached_query()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
         )
     ''')
 
+    for table in TRACKED_TABLES + ("customer_names", "leads_archive"):
+        cursor.execute('INSERT OR IGNORE INTO table_versions (table_name) VALUES (?)', (table,))
+
+    for table in TRACKED_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+                END
+            ''')
+
+    for event in ("INSERT", "UPDATE OF name", "DELETE"):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_customer_names_{event.split()[0].lower()}_version
+            AFTER {event} ON customers
+            BEGIN
+                UPDATE table_versions SET version = version + 1 WHERE table_name = 'customer_names';
+            END
+        ''')
+
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
     conn.commit()
     conn.close()
 
 
+def _add_column_if_missing(cursor, table, column, definition):
+    """Add a column to an existing table unless it is already there"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def ensure_database():
+    """Bootstrap the schema once per process.
+
+    Streamlit re-executes every page script on each widget interaction, so the
+    pages call this instead of init_database(). After the first call for a
+    database file it is a set lookup; the first call only runs the DDL when the
+    file's PRAGMA user_version is behind SCHEMA_VERSION.
+    """
+    db_path = get_db_path()
+    if db_path in _bootstrapped_paths:
+        return
+
+    with _bootstrap_lock:
+        if db_path in _bootstrapped_paths:
+            return
+
+        conn = get_connection()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        conn.close()
+
+        if version < SCHEMA_VERSION:
+            init_database()
+
+        _bootstrapped_paths.add(db_path)
+
+
+def get_table_versions(tables):
+    """Get the change counters for the given tables"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    placeholders = ", ".join("?" for _ in tables)
+    cursor.execute(
+        f'SELECT table_name, version FROM table_versions WHERE table_name IN ({placeholders})',
+        tuple(tables)
+    )
+    versions = dict(cursor.fetchall())
+    conn.close()
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+def cached_query(*tables, replica=False):
+    """Serve a read function's result from memory until one of `tables` changes.
+
+    Each call costs one primary-key lookup on table_versions instead of the
+    full query. The counters are maintained by triggers, so writes from other
+    processes invalidate the cache as well. Callers get a shallow copy of the
+    cached result and may modify it freely.
+
+    Functions reading through get_read_connection() pass replica=True: their
+    results are also keyed by the replica copy they were read from, so they
+    refresh along with the replica.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (get_db_path(), _replica_generation() if replica else None, func.__name__, args,
+                   tuple(sorted(kwargs.items())))
+            # Read the counters before running the query: a write landing in
+            # between leaves a result newer than its versions, which only
+            # costs one extra refresh on the next call.
+            versions = get_table_versions(tables)
+
+            with _query_cache_lock:
+                entry = _query_cache.get(key)
+            if entry is not None and entry[0] == versions:
+                return copy.copy(entry[1])
+
+            result = func(*args, **kwargs)
+
+            with _query_cache_lock:
+                _query_cache.pop(key, None)
+                _query_cache[key] = (versions, result)
+                while len(_query_cache) > QUERY_CACHE_SIZE:
+                    _query_cache.pop(next(iter(_query_cache)))
+            return copy.copy(result)
+        return wrapper
+    return decorator
+
+
+def clear_query_cache():
+    """Drop all cached query results"""
+    with _query_cache_lock:
+        _query_cache.clear()
+
+
 # Employee Functions
-def add_employee(name, email="", phone=""):
+def add_employee(name, email="", phone="", team=None):
     """Add a new employee"""
     conn = get_connection()
     cursor = conn.cursor()
     try:
         cursor.execute(
-            'INSERT INTO employees (name, email, phone) VALUES (?, ?, ?)',
-            (name, email, phone)
+            'INSERT INTO employees (name, email, phone, team) VALUES (?, ?, ?, ?)',
+            (name, email, phone, team or None)
         )
         conn.commit()
         conn.close()
@@ -112,6 +716,7 @@ def add_employee(name, email="", phone=""):
         return False, str(e)
 
 
+@cached_query("employees")
 def get_all_employees():
     """Get all employees"""
     conn = get_connection()
@@ -131,6 +736,131 @@ def delete_employee(name):
     conn.close()
 
 
+def update_employee_team(name, team):
+    """Set an employee's team"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('UPDATE employees SET team = ? WHERE name = ?', (team or None, name))
+    conn.commit()
+    conn.close()
+    return True, "Team updated successfully"
+
+
+@cached_query("employees")
+def get_employee_teams():
+    """Get a mapping of employee name to team"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT name, team FROM employees ORDER BY name')
+    teams = dict(cursor.fetchall())
+    conn.close()
+    return teams
+
+
+@cached_query("employees")
+def get_team_members(employee_name):
+    """Get the employees in the same team as employee_name (including them)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        '''SELECT e.name FROM employees me
+           JOIN employees e ON e.team = me.team
+           WHERE me.name = ?
+           ORDER BY e.name''',
+        (employee_name,)
+    )
+    members = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return members or [employee_name]
+
+
+# User Functions
+def add_user(username, password_hash, role="rep", employee_name=None):
+    """Add a login account"""
+    if role not in USER_ROLES:
+        return False, f"Unknown role: {role}"
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            'INSERT INTO users (username, password_hash, role, employee_name) VALUES (?, ?, ?, ?)',
+            (username, password_hash, role, employee_name or None)
+        )
+        conn.commit()
+        conn.close()
+        return True, "User added successfully"
+    except sqlite3.IntegrityError:
+        conn.close()
+        return False, "User already exists"
+    except Exception as e:
+        conn.close()
+        return False, str(e)
+
+
+def get_user(username):
+    """Get a login account by username, including its password hash"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT username, password_hash, role, employee_name FROM users WHERE username = ?',
+        (username,)
+    )
+    result = cursor.fetchone()
+    conn.close()
+    if result:
+        return {"username": result[0], "password_hash": result[1], "role": result[2], "employee_name": result[3]}
+    return None
+
+
+@cached_query("users")
+def get_all_users():
+    """Get all login accounts (without password hashes)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT username, role, employee_name FROM users ORDER BY username')
+    users = cursor.fetchall()
+    conn.close()
+    return users
+
+
+def delete_user(username):
+    """Delete a login account"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM users WHERE username = ?', (username,))
+    cursor.execute('DELETE FROM saved_views WHERE username = ?', (username,))
+    conn.commit()
+    conn.close()
+
+
+def get_visibility_scope(role, employee_name):
+    """Get the employee names whose leads a user may see, or None for everything"""
+    if role == "admin":
+        return None
+    if not employee_name:
+        return ()
+    if role == "team_lead":
+        return tuple(get_team_members(employee_name))
+    return (employee_name,)
+
+
+# Columns a visibility scope matches employee names against
+_SCOPE_COLUMNS = ("assigned_sales_person", "follow_up_by")
+
+
+def _scope_condition(scope, alias="l"):
+    """Get a SQL condition and parameters restricting leads to a visibility scope.
+
+    Both columns are indexed, so SQLite answers the OR with one index probe per
+    name instead of scanning the table.
+    """
+    if scope is None:
+        return "1 = 1", []
+    placeholders = ", ".join("?" for _ in scope)
+    conditions = " OR ".join(f"{alias}.{column} IN ({placeholders})" for column in _SCOPE_COLUMNS)
+    return f"({conditions})", [*scope] * len(_SCOPE_COLUMNS)
+
+
 # Customer Functions
 def add_customer(name, contact_person="", email="", phone="", address=""):
     """Add a new customer"""
@@ -152,6 +882,7 @@ def add_customer(name, contact_person="", email="", phone="", address=""):
         return False, str(e)
 
 
+@cached_query("customers")
 def get_all_customers():
     """Get all customers"""
     conn = get_connection()
@@ -162,6 +893,7 @@ def get_all_customers():
     return customers
 
 
+@cached_query("customer_names")
 def get_customer_id(customer_name):
     """Get customer ID by name"""
     conn = get_connection()
@@ -189,6 +921,7 @@ def update_customer(name, contact_person="", email="", phone="", address=""):
         return False, str(e)
 
 
+@cached_query("customers")
 def get_customer_details(customer_name):
     """Get customer details"""
     conn = get_connection()
@@ -232,15 +965,18 @@ def get_next_initial_offer_number(customer_name, project_category):
     """Get next initial offer number for a customer and project category"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        '''SELECT MAX(initial_offer_number) FROM leads 
-           WHERE customer_id = (SELECT id FROM customers WHERE name = ?) 
-           AND project_category = ?''',
-        (customer_name, project_category)
-    )
-    result = cursor.fetchone()
+    query = '''SELECT MAX(initial_offer_number) FROM {table}
+                 WHERE customer_id = (SELECT id FROM main.customers WHERE name = ?)
+                 AND project_category = ?'''
+    cursor.execute(query.format(table="main.leads"), (customer_name, project_category))
+    max_num = cursor.fetchone()[0] or 0
+
+    # Archived offers keep their numbers, so they must not be handed out again
+    if _attach_archive(conn):
+        cursor.execute(query.format(table="archive.leads"), (customer_name, project_category))
+        max_num = max(max_num, cursor.fetchone()[0] or 0)
+
     conn.close()
-    max_num = result[0] if result[0] else 0
     return max_num + 1
 
 
@@ -249,9 +985,9 @@ def get_next_offer_revision_number(customer_name, project_category, initial_offe
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
-        '''SELECT MAX(CAST(SUBSTR(offer_revision_number, 2) AS INTEGER)) FROM leads 
-           WHERE customer_id = (SELECT id FROM customers WHERE name = ?) 
-           AND project_category = ? 
+        '''SELECT MAX(revision) FROM leads
+           WHERE customer_id = (SELECT id FROM customers WHERE name = ?)
+           AND project_category = ?
            AND initial_offer_number = ?''',
         (customer_name, project_category, initial_offer_number)
     )
@@ -262,9 +998,9 @@ def get_next_offer_revision_number(customer_name, project_category, initial_offe
 
 
 def generate_serial_number(project_category, customer_name, offer_created_date, initial_offer_number, offer_revision_number):
-    """Generate serial number: XBL/<Project Category>/<Customer Name>/<date>/<Initial Offer number>/<Offer Revision Number>"""
+    """Generate serial number: <prefix>/<Project Category>/<Customer Name>/<date>/<Initial Offer number>/<Offer Revision Number>"""
     date_str = offer_created_date.strftime("%Y%m%d")
-    serial = f"XBL/{project_category}/{customer_name}/{date_str}/{initial_offer_number}/{offer_revision_number}"
+    serial = f"{get_serial_prefix()}/{project_category}/{customer_name}/{date_str}/{initial_offer_number}/{offer_revision_number}"
     return serial
 
 
@@ -292,13 +1028,18 @@ def add_lead(customer_id, project_category, assigned_sales_person, offer_created
             '''INSERT INTO leads (customer_id, project_category, assigned_sales_person, offer_created,
                                  lead_through, scope_of_work, status, initial_offer_number, 
                                  offer_revision_number, offered_value, priority, follow_up_by,
-                                 follow_up_status, follow_up_date, next_follow_up_date, serial_number)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                                 follow_up_status, follow_up_date, next_follow_up_date, serial_number,
+                                 revision)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
             (customer_id, project_category, assigned_sales_person, offer_created,
              lead_through, scope_of_work, status, initial_offer_number,
              offer_revision_number, offered_value, priority, follow_up_by,
-             follow_up_status, follow_up_date, next_follow_up_date, serial_number)
+             follow_up_status, follow_up_date, next_follow_up_date, serial_number,
+             int(offer_revision_number[1:]))
         )
+        lead_id = cursor.lastrowid
+        _mark_latest_revision(cursor, lead_id)
+        _rescore_offer(cursor, lead_id)
         conn.commit()
         conn.close()
         return True, "Lead added successfully"
@@ -307,44 +1048,219 @@ def add_lead(customer_id, project_category, assigned_sales_person, offer_created
         return False, str(e)
 
 
-def get_all_leads():
-    """Get all leads"""
-    conn = get_connection()
-    cursor = conn.cursor()
+def _mark_latest_revision(cursor, lead_id):
+    """Clear the latest-revision flag on the other revisions of a lead's offer"""
     cursor.execute(
-        '''SELECT l.id, c.name, l.project_category, l.assigned_sales_person, 
-                  l.offer_created, l.status, l.initial_offer_number, l.offer_revision_number,
-                  l.priority, l.follow_up_date, l.next_follow_up_date, l.serial_number
-           FROM leads l
-           JOIN customers c ON l.customer_id = c.id
-           ORDER BY l.created_at DESC'''
+        '''UPDATE leads SET is_latest = 0
+           WHERE is_latest = 1 AND id != ?
+           AND (customer_id, project_category, initial_offer_number) =
+               (SELECT customer_id, project_category, initial_offer_number FROM leads WHERE id = ?)''',
+        (lead_id, lead_id)
     )
-    leads = cursor.fetchall()
-    conn.close()
-    return leads
 
 
-def get_lead_by_id(lead_id):
-    """Get lead details by ID"""
+def revise_lead(lead_id):
+    """Clone a lead into the next revision of its offer"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        '''SELECT l.*, c.name as customer_name FROM leads l
-           JOIN customers c ON l.customer_id = c.id
-           WHERE l.id = ?''',
-        (lead_id,)
-    )
-    lead = cursor.fetchone()
-    conn.close()
-    return lead
+    try:
+        # Take the write lock up front so two people revising the same offer
+        # cannot both read the same MAX(revision)
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(
+            '''SELECT l.customer_id, l.project_category, l.assigned_sales_person, l.lead_through,
+                      l.scope_of_work, l.status, l.initial_offer_number, l.offered_value,
+                      l.priority, l.follow_up_by, l.follow_up_status, l.follow_up_date,
+                      l.next_follow_up_date, c.name
+               FROM leads l
+               JOIN customers c ON l.customer_id = c.id
+               WHERE l.id = ?''',
+            (lead_id,)
+        )
+        lead = cursor.fetchone()
+        if not lead:
+            conn.rollback()
+            conn.close()
+            return False, "Lead not found"
 
+        (customer_id, project_category, assigned_sales_person, lead_through, scope_of_work,
+         status, initial_offer_number, offered_value, priority, follow_up_by,
+         follow_up_status, follow_up_date, next_follow_up_date, customer_name) = lead
 
-def update_lead(lead_id, **kwargs):
-    """Update lead information"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Build update query dynamically
+        cursor.execute(
+            '''SELECT MAX(revision) FROM leads
+               WHERE customer_id = ? AND project_category = ? AND initial_offer_number = ?''',
+            (customer_id, project_category, initial_offer_number)
+        )
+        revision = (cursor.fetchone()[0] or 0) + 1
+        offer_revision_number = f"R{revision}"
+        offer_created = datetime.today().date()
+
+        serial_number = None
+        if status == "Price Offered":
+            serial_number = generate_serial_number(
+                project_category, customer_name, offer_created,
+                initial_offer_number, offer_revision_number
+            )
+
+        cursor.execute(
+            '''INSERT INTO leads (customer_id, project_category, assigned_sales_person, offer_created,
+                                 lead_through, scope_of_work, status, initial_offer_number,
+                                 offer_revision_number, offered_value, priority, follow_up_by,
+                                 follow_up_status, follow_up_date, next_follow_up_date, serial_number,
+                                 revision, parent_lead_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (customer_id, project_category, assigned_sales_person, offer_created,
+             lead_through, scope_of_work, status, initial_offer_number,
+             offer_revision_number, offered_value, priority, follow_up_by,
+             follow_up_status, follow_up_date, next_follow_up_date, serial_number,
+             revision, lead_id)
+        )
+        new_lead_id = cursor.lastrowid
+        _mark_latest_revision(cursor, new_lead_id)
+        _rescore_offer(cursor, new_lead_id)
+        conn.commit()
+        conn.close()
+        return True, f"Created revision {offer_revision_number}"
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return False, str(e)
+
+
+@cached_query("leads")
+def get_offer_revisions(lead_id):
+    """Get all revisions of the offer a lead belongs to, oldest first"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        '''SELECT r.id, r.offer_revision_number, r.offer_created, r.status, r.offered_value, r.is_latest
+           FROM leads l
+           JOIN leads r ON r.customer_id = l.customer_id
+                       AND r.project_category = l.project_category
+                       AND r.initial_offer_number = l.initial_offer_number
+           WHERE l.id = ?
+           ORDER BY r.revision''',
+        (lead_id,)
+    )
+    revisions = cursor.fetchall()
+    conn.close()
+    return revisions
+
+
+# Columns the lead listings show; the archive union also selects every
+# column a filter or scope can compare (see _LEAD_UNION_COLUMNS)
+_LEAD_LIST_COLUMNS = ("id", "customer_id", "project_category", "assigned_sales_person", "offer_created",
+                      "status", "initial_offer_number", "offer_revision_number", "priority",
+                      "follow_up_date", "next_follow_up_date", "serial_number", "created_at")
+
+
+def _lead_list_source(conn, include_revisions, include_archive):
+    """Get the FROM source for lead listings, unioned with the archive when asked"""
+    where = "" if include_revisions else "WHERE is_latest = 1"
+    if include_archive and _attach_archive(conn):
+        return f'''(SELECT {_LEAD_UNION_COLUMNS} FROM main.leads {where}
+                   UNION ALL
+                   SELECT {_LEAD_UNION_COLUMNS} FROM archive.leads {where})'''
+    return "main.leads" if include_revisions else "main.latest_leads"
+
+
+@cached_query("leads", "customer_names", "leads_archive")
+def get_all_leads(include_revisions=False, include_archive=False, scope=None):
+    """Get all leads (latest revision of each offer unless include_revisions, archive only if include_archive)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    source = _lead_list_source(conn, include_revisions, include_archive)
+    scope_condition, scope_params = _scope_condition(scope)
+    cursor.execute(
+        f'''SELECT l.id, c.name, l.project_category, l.assigned_sales_person,
+                  l.offer_created, l.status, l.initial_offer_number, l.offer_revision_number,
+                  l.priority, l.follow_up_date, l.next_follow_up_date, l.serial_number
+           FROM {source} l
+           JOIN main.customers c ON l.customer_id = c.id
+           WHERE {scope_condition}
+           ORDER BY l.created_at DESC''',
+        scope_params
+    )
+    leads = cursor.fetchall()
+    conn.close()
+    return leads
+
+
+@cached_query("leads", "customer_names", "leads_archive")
+def get_lead_by_id(lead_id, scope=None):
+    """Get lead details by ID, falling back to the archive (None if outside scope)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    scope_condition, scope_params = _scope_condition(scope)
+    query = f'''SELECT l.*, c.name as customer_name FROM {{table}} l
+                  JOIN main.customers c ON l.customer_id = c.id
+                  WHERE l.id = ? AND {scope_condition}'''
+    cursor.execute(query.format(table="main.leads"), (lead_id, *scope_params))
+    lead = cursor.fetchone()
+    if lead is None and _attach_archive(conn):
+        cursor.execute(query.format(table="archive.leads"), (lead_id, *scope_params))
+        lead = cursor.fetchone()
+    conn.close()
+    return lead
+
+
+@cached_query("leads", "customer_names", "leads_archive")
+def search_lead_options(term="", include_revisions=False, include_archive=False, scope=None, limit=50):
+    """Get up to limit (id, label) pairs for a lead picker over the rows get_all_leads() lists, newest first.
+
+    A numeric term matches the lead ID of any lead in scope, superseded or
+    archived included; any other term matches part of the customer name. An
+    empty term gives the newest leads.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    scope_condition, scope_params = _scope_condition(scope)
+    term = (term or "").strip()
+    if term.isdigit():
+        source = _lead_list_source(conn, True, True)
+        condition, params = "l.id = ?", [int(term)]
+    else:
+        source = _lead_list_source(conn, include_revisions, include_archive)
+        if term:
+            condition, params = "l.customer_id IN (SELECT id FROM main.customers WHERE name LIKE ?)", [f"%{term}%"]
+        else:
+            condition, params = "1 = 1", []
+    cursor.execute(
+        f'''SELECT l.id, c.name, l.project_category, l.initial_offer_number, l.offer_revision_number, l.status
+           FROM {source} l
+           JOIN main.customers c ON l.customer_id = c.id
+           WHERE {condition} AND {scope_condition}
+           ORDER BY l.created_at DESC
+           LIMIT ?''',
+        (*params, *scope_params, limit)
+    )
+    options = [(lead_id, f"ID {lead_id} - {customer} - {category} #{offer_number} {revision} ({status})")
+               for lead_id, customer, category, offer_number, revision, status in cursor.fetchall()]
+    conn.close()
+    return options
+
+
+@cached_query("leads", "leads_archive")
+def is_archived_lead(lead_id):
+    """Check whether a lead has been moved to the archive"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT 1 FROM main.leads WHERE id = ?', (lead_id,))
+    archived = cursor.fetchone() is None and _attach_archive(conn)
+    if archived:
+        cursor.execute('SELECT 1 FROM archive.leads WHERE id = ?', (lead_id,))
+        archived = cursor.fetchone() is not None
+    conn.close()
+    return archived
+
+
+def update_lead(lead_id, **kwargs):
+    """Update lead information"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    # Build update query dynamically
     update_fields = []
     values = []
     for key, value in kwargs.items():
@@ -357,6 +1273,8 @@ def update_lead(lead_id, **kwargs):
         query = f"UPDATE leads SET updated_at = CURRENT_TIMESTAMP, {', '.join(update_fields)} WHERE id = ?"
         try:
             cursor.execute(query, values)
+            if any(field in kwargs for field in SCORE_FIELDS):
+                _rescore_offer(cursor, lead_id)
             conn.commit()
             conn.close()
             return True, "Lead updated successfully"
@@ -368,40 +1286,901 @@ def update_lead(lead_id, **kwargs):
     return False, "No fields to update"
 
 
-def get_leads_by_status(status):
-    """Get leads by status"""
+@cached_query("leads", "customer_names", "leads_archive")
+def get_leads_by_status(status, include_revisions=False, include_archive=False, scope=None):
+    """Get leads by status (latest revision of each offer unless include_revisions, archive only if include_archive)"""
     conn = get_connection()
     cursor = conn.cursor()
+    source = _lead_list_source(conn, include_revisions, include_archive)
+    scope_condition, scope_params = _scope_condition(scope)
     cursor.execute(
-        '''SELECT l.id, c.name, l.project_category, l.assigned_sales_person,
+        f'''SELECT l.id, c.name, l.project_category, l.assigned_sales_person,
                   l.offer_created, l.status, l.initial_offer_number, l.offer_revision_number,
                   l.priority, l.follow_up_date, l.next_follow_up_date, l.serial_number
-           FROM leads l
-           JOIN customers c ON l.customer_id = c.id
-           WHERE l.status = ?
+           FROM {source} l
+           JOIN main.customers c ON l.customer_id = c.id
+           WHERE l.status = ? AND {scope_condition}
            ORDER BY l.created_at DESC''',
-        (status,)
+        (status, *scope_params)
     )
     leads = cursor.fetchall()
     conn.close()
     return leads
 
 
-def get_leads_needing_followup(today_date):
-    """Get leads that need follow-up today or earlier"""
+@cached_query("leads", "customer_names")
+def get_leads_needing_followup(today_date, scope=None):
+    """Get leads that need follow-up today or earlier (latest revisions only)"""
     conn = get_connection()
     cursor = conn.cursor()
+    scope_condition, scope_params = _scope_condition(scope)
     cursor.execute(
-        '''SELECT l.id, c.name, l.project_category, l.assigned_sales_person,
+        f'''SELECT l.id, c.name, l.project_category, l.assigned_sales_person,
                   l.offer_created, l.status, l.follow_up_date, l.next_follow_up_date
-           FROM leads l
+           FROM latest_leads l
            JOIN customers c ON l.customer_id = c.id
            WHERE l.next_follow_up_date IS NOT NULL 
            AND l.next_follow_up_date <= ?
            AND l.status NOT IN ('Won', 'Lost', 'Completed')
+           AND {scope_condition}
+           ORDER BY l.next_follow_up_date ASC''',
+        (today_date, *scope_params)
+    )
+    leads = cursor.fetchall()
+    conn.close()
+    return leads
+
+
+def get_followup_digest_leads(today_date):
+    """Get open leads due for follow-up by today, with the person to remind and their email.
+
+    Rows are (person, email, lead id, customer, category, status, next
+    follow-up date, follow-up status), ordered by next follow-up date so the
+    range is read straight from idx_leads_latest_next_follow_up. The person
+    is follow_up_by, or the assigned sales person when nobody is set.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        '''SELECT COALESCE(l.follow_up_by, l.assigned_sales_person), e.email,
+                  l.id, c.name, l.project_category, l.status, l.next_follow_up_date, l.follow_up_status
+           FROM latest_leads l
+           JOIN customers c ON l.customer_id = c.id
+           LEFT JOIN employees e ON e.name = COALESCE(l.follow_up_by, l.assigned_sales_person)
+           WHERE l.next_follow_up_date IS NOT NULL
+           AND l.next_follow_up_date <= ?
+           AND l.status NOT IN ('Won', 'Lost', 'Completed')
            ORDER BY l.next_follow_up_date ASC''',
         (today_date,)
     )
     leads = cursor.fetchall()
     conn.close()
     return leads
+
+
+def get_sent_digests(digest_date):
+    """Get the names of everyone already sent a follow-up digest for a date"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT employee_name FROM reminder_digests_sent WHERE digest_date = ?', (digest_date,))
+    names = {row[0] for row in cursor.fetchall()}
+    conn.close()
+    return names
+
+
+def record_sent_digests(digest_date, sent):
+    """Record digests as sent; sent is a list of (employee name, lead count)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.executemany(
+        '''INSERT OR IGNORE INTO reminder_digests_sent (employee_name, digest_date, lead_count)
+           VALUES (?, ?, ?)''',
+        [(name, digest_date, count) for name, count in sent]
+    )
+    conn.commit()
+    conn.close()
+
+
+# Filters understood by search_leads(). List filters match any of their values;
+# ranges are inclusive and either end may be left out.
+LEAD_FILTERS = ("statuses", "sales_persons", "categories", "priorities",
+                "offer_from", "offer_to", "next_follow_up_from", "next_follow_up_to",
+                "min_value", "max_value", "overdue")
+
+
+def normalize_lead_filters(filters):
+    """Get filters as a sorted tuple of (name, value), without empty ones.
+
+    Lists become tuples and dates ISO strings, so the result can be used as a
+    cache key and stored as JSON.
+    """
+    normalized = []
+    for name, value in (filters or {}).items():
+        if name not in LEAD_FILTERS:
+            raise ValueError(f"Unknown lead filter: {name}")
+        if isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(value))
+        elif hasattr(value, "isoformat"):
+            value = value.isoformat()
+        if value is None or value is False or value == "" or value == ():
+            continue
+        normalized.append((name, value))
+    return tuple(sorted(normalized))
+
+
+# (filter, column) and (low filter, high filter, column) compiled by _lead_filter_conditions()
+_LEAD_EQUALITY_FILTERS = (("statuses", "status"), ("sales_persons", "assigned_sales_person"),
+                          ("categories", "project_category"), ("priorities", "priority"))
+_LEAD_RANGE_FILTERS = (("offer_from", "offer_to", "offer_created"),
+                       ("next_follow_up_from", "next_follow_up_to", "next_follow_up_date"),
+                       ("min_value", "max_value", "offered_value"))
+# Columns of the hot + archive union in _lead_list_source(), so that any
+# filter or scope condition on alias l also works with the archive included
+_LEAD_UNION_COLUMNS = ", ".join(dict.fromkeys(
+    [*_LEAD_LIST_COLUMNS, *_SCOPE_COLUMNS,
+     *(column for _, column in _LEAD_EQUALITY_FILTERS), *(column for _, _, column in _LEAD_RANGE_FILTERS)]
+))
+
+
+def _lead_filter_conditions(filters, today_date):
+    """Compile normalized filters into (WHERE conditions, params) on alias l.
+
+    Conditions are emitted equality first, then ranges, in the column order
+    of the leads indexes (status, assigned_sales_person, then dates), and
+    every predicate compares a bare column so an index can serve it.
+    """
+    filters = dict(filters)
+    conditions = []
+    params = []
+
+    for name, column in _LEAD_EQUALITY_FILTERS:
+        if name in filters:
+            conditions.append(f"l.{column} IN ({', '.join('?' for _ in filters[name])})")
+            params.extend(filters[name])
+
+    for low, high, column in _LEAD_RANGE_FILTERS:
+        if low in filters:
+            conditions.append(f"l.{column} >= ?")
+            params.append(filters[low])
+        if high in filters:
+            conditions.append(f"l.{column} <= ?")
+            params.append(filters[high])
+
+    if filters.get("overdue"):
+        conditions.append("l.next_follow_up_date < ?")
+        params.append(today_date)
+        conditions.append(f"l.status NOT IN ({', '.join('?' for _ in CLOSED_STATUSES)})")
+        params.extend(CLOSED_STATUSES)
+
+    return conditions, params
+
+
+def search_leads(filters, today_date=None, include_revisions=False, include_archive=False, scope=None, limit=None):
+    """Get leads matching every filter in one query (see LEAD_FILTERS), newest first"""
+    today_date = today_date or datetime.now().date()
+    return _search_leads(normalize_lead_filters(filters), today_date, include_revisions, include_archive,
+                         scope, limit)
+
+
+@cached_query("leads", "customer_names", "leads_archive")
+def _search_leads(filters, today_date, include_revisions, include_archive, scope, limit):
+    conn = get_connection()
+    cursor = conn.cursor()
+    source = _lead_list_source(conn, include_revisions, include_archive)
+    conditions, params = _lead_filter_conditions(filters, today_date)
+    scope_condition, scope_params = _scope_condition(scope)
+    conditions.append(scope_condition)
+    params.extend(scope_params)
+    limit_clause = ""
+    if limit:
+        limit_clause = "LIMIT ?"
+        params.append(limit)
+    cursor.execute(
+        f'''SELECT l.id, c.name, l.project_category, l.assigned_sales_person,
+                  l.offer_created, l.status, l.initial_offer_number, l.offer_revision_number,
+                  l.priority, l.follow_up_date, l.next_follow_up_date, l.serial_number
+           FROM {source} l
+           JOIN main.customers c ON l.customer_id = c.id
+           WHERE {" AND ".join(conditions)}
+           ORDER BY l.created_at DESC
+           {limit_clause}''',
+        params
+    )
+    leads = cursor.fetchall()
+    conn.close()
+    return leads
+
+
+# Saved View Functions
+def save_view(username, name, filters):
+    """Save a named lead filter for a user, replacing one with the same name"""
+    if not name:
+        return False, "Please enter a view name"
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            '''INSERT INTO saved_views (username, name, filters) VALUES (?, ?, ?)
+               ON CONFLICT(username, name) DO UPDATE SET filters = excluded.filters''',
+            (username, name, json.dumps(dict(normalize_lead_filters(filters))))
+        )
+        conn.commit()
+        conn.close()
+        return True, "View saved successfully"
+    except Exception as e:
+        conn.close()
+        return False, str(e)
+
+
+@cached_query("saved_views")
+def get_saved_views(username):
+    """Get a user's saved views as {name: filters}"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT name, filters FROM saved_views WHERE username = ? ORDER BY name', (username,))
+    views = {name: json.loads(filters) for name, filters in cursor.fetchall()}
+    conn.close()
+    return views
+
+
+def delete_saved_view(username, name):
+    """Delete a user's saved view"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM saved_views WHERE username = ? AND name = ?', (username, name))
+    conn.commit()
+    conn.close()
+
+
+@cached_query("leads", "leads_archive", replica=True)
+def get_lead_status_counts(scope=None, include_archive=False):
+    """Get {status: number of offers} over the latest revisions, for dashboards"""
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    schemas = ["main"]
+    if include_archive and _attach_archive(conn):
+        schemas.append("archive")
+    scope_condition, scope_params = _scope_condition(scope)
+    counts = {}
+    # One grouped query per file, each walking its status index, summed here
+    for schema in schemas:
+        cursor.execute(
+            f'''SELECT l.status, COUNT(*) FROM {schema}.leads l
+               WHERE l.is_latest = 1 AND {scope_condition}
+               GROUP BY l.status''',
+            scope_params
+        )
+        for status, count in cursor.fetchall():
+            counts[status] = counts.get(status, 0) + count
+    conn.close()
+    return counts
+
+
+@cached_query("leads", "leads_archive", replica=True)
+def get_customer_offer_summary(customer_id, scope=None, include_archive=False):
+    """Get one row per offer of a customer, aggregated over its revisions.
+
+    Each row is (project_category, initial_offer_number, revisions, latest
+    revision number, latest status, latest offered value, last follow-up date,
+    next follow-up date of the open latest revision). Without include_archive
+    this is answered entirely from idx_leads_customer_offers.
+    """
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    scope_condition, scope_params = _scope_condition(scope)
+    columns = '''project_category, initial_offer_number, revision, is_latest, status, offered_value,
+                 follow_up_date, next_follow_up_date, assigned_sales_person, follow_up_by'''
+    source = "main.leads"
+    params = [customer_id]
+    if include_archive and _attach_archive(conn):
+        source = f'''(SELECT customer_id, {columns} FROM main.leads WHERE customer_id = ?
+                    UNION ALL
+                    SELECT customer_id, {columns} FROM archive.leads WHERE customer_id = ?)'''
+        params = [customer_id, customer_id, customer_id]
+    closed_placeholders = ", ".join("?" for _ in CLOSED_STATUSES)
+    cursor.execute(
+        f'''SELECT l.project_category, l.initial_offer_number,
+                  GROUP_CONCAT('R' || l.revision, ', '),
+                  MAX(l.revision),
+                  MAX(CASE WHEN l.is_latest = 1 THEN l.status END),
+                  MAX(CASE WHEN l.is_latest = 1 THEN l.offered_value END),
+                  MAX(l.follow_up_date),
+                  MIN(CASE WHEN l.is_latest = 1 AND l.status NOT IN ({closed_placeholders})
+                           THEN l.next_follow_up_date END)
+           FROM {source} l
+           WHERE l.customer_id = ? AND {scope_condition}
+           GROUP BY l.project_category, l.initial_offer_number
+           ORDER BY l.project_category, l.initial_offer_number''',
+        (*CLOSED_STATUSES, *params, *scope_params)
+    )
+    offers = cursor.fetchall()
+    conn.close()
+    return offers
+
+
+# Attachment Functions
+def add_lead_attachment(lead_id, sha256, filename, size, content_type=None, uploaded_by=None):
+    """Record an attachment stored in the attachments store"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            '''INSERT INTO lead_attachments (lead_id, sha256, filename, size, content_type, uploaded_by)
+               VALUES (?, ?, ?, ?, ?, ?)''',
+            (lead_id, sha256, filename, size, content_type, uploaded_by)
+        )
+        conn.commit()
+        conn.close()
+        return True, "Attachment added successfully"
+    except Exception as e:
+        conn.close()
+        return False, str(e)
+
+
+@cached_query("lead_attachments")
+def get_lead_attachments(lead_id):
+    """Get a lead's attachments, newest first"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        '''SELECT id, filename, size, content_type, uploaded_at, sha256, uploaded_by
+           FROM lead_attachments
+           WHERE lead_id = ?
+           ORDER BY id DESC''',
+        (lead_id,)
+    )
+    attachments = cursor.fetchall()
+    conn.close()
+    return attachments
+
+
+def get_attachment(attachment_id):
+    """Get attachment metadata by ID"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT id, lead_id, filename, size, content_type, sha256 FROM lead_attachments WHERE id = ?',
+        (attachment_id,)
+    )
+    attachment = cursor.fetchone()
+    conn.close()
+    return attachment
+
+
+def is_attachment_file_used(sha256):
+    """Check whether any attachment record still uses a stored file"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT 1 FROM lead_attachments WHERE sha256 = ? LIMIT 1', (sha256,))
+    used = cursor.fetchone() is not None
+    conn.close()
+    return used
+
+
+def delete_lead_attachment(attachment_id):
+    """Delete an attachment record; return its sha256 if no other record uses the file"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    cursor.execute('SELECT sha256 FROM lead_attachments WHERE id = ?', (attachment_id,))
+    result = cursor.fetchone()
+    if not result:
+        conn.rollback()
+        conn.close()
+        return None
+    cursor.execute('DELETE FROM lead_attachments WHERE id = ?', (attachment_id,))
+    cursor.execute('SELECT 1 FROM lead_attachments WHERE sha256 = ? LIMIT 1', (result[0],))
+    still_used = cursor.fetchone() is not None
+    conn.commit()
+    conn.close()
+    return None if still_used else result[0]
+
+
+# Change Feed Functions
+def get_lead_changes(since_seq=0, limit=1000):
+    """Get lead changes after the since_seq watermark, oldest first.
+
+    Returns (changes, next_seq, has_more). Each change is a dict with seq,
+    lead_id, operation ("insert", "update", "delete" or "archive"), changed_at
+    and lead: the lead's current row as a dict (its archived row for
+    "archive"), or None for deletes, which are tombstones. A lead changed
+    several times in one batch is reported once, at its last change. Pass
+    next_seq back to resume.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        '''SELECT seq, lead_id, operation, changed_at FROM lead_changes
+           WHERE seq > ?
+           ORDER BY seq
+           LIMIT ?''',
+        (since_seq, limit + 1)
+    )
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        conn.close()
+        return [], since_seq, False
+
+    latest = {}
+    for seq, lead_id, operation, changed_at in rows:
+        latest[lead_id] = {"seq": seq, "lead_id": lead_id, "operation": operation,
+                           "changed_at": changed_at, "lead": None}
+
+    def load_rows(table, lead_ids):
+        for start in range(0, len(lead_ids), 500):
+            chunk = lead_ids[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            cursor.execute(
+                f'''SELECT l.*, c.name AS customer_name FROM {table} l
+                    LEFT JOIN main.customers c ON l.customer_id = c.id
+                    WHERE l.id IN ({placeholders})''',
+                chunk
+            )
+            columns = [col[0] for col in cursor.description]
+            for row in cursor.fetchall():
+                latest[row[0]]["lead"] = dict(zip(columns, row))
+
+    load_rows("main.leads", [lead_id for lead_id, change in latest.items()
+                             if change["operation"] in ("insert", "update")])
+    # Archived leads carry their final row, so a consumer that never saw
+    # the lead while it was live still receives it
+    archived_ids = [lead_id for lead_id, change in latest.items() if change["operation"] == "archive"]
+    if archived_ids and _attach_archive(conn):
+        load_rows("archive.leads", archived_ids)
+    conn.close()
+
+    # A live change whose row is gone was deleted later; that delete is in a
+    # later batch, so leave it to that batch
+    changes = sorted(
+        (change for change in latest.values()
+         if change["lead"] is not None or change["operation"] == "delete"),
+        key=lambda change: change["seq"]
+    )
+    return changes, rows[-1][0], has_more
+
+
+def prune_lead_changes(up_to_seq):
+    """Delete change feed rows up to and including up_to_seq once every consumer has them"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM lead_changes WHERE seq <= ?', (up_to_seq,))
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+# Archive Functions
+def _ensure_archive_schema(cursor):
+    """Create or widen archive.leads so it has every column of main.leads plus archived_at"""
+    cursor.execute('PRAGMA main.table_info(leads)')
+    columns = [(row[1], row[2]) for row in cursor.fetchall()]
+
+    column_defs = ", ".join(
+        "id INTEGER PRIMARY KEY" if name == "id" else f"{name} {col_type}"
+        for name, col_type in columns
+    )
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS archive.leads ({column_defs}, archived_at TIMESTAMP)')
+
+    cursor.execute('PRAGMA archive.table_info(leads)')
+    archived_columns = {row[1] for row in cursor.fetchall()}
+    for name, col_type in columns:
+        if name not in archived_columns:
+            cursor.execute(f'ALTER TABLE archive.leads ADD COLUMN {name} {col_type}')
+
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS archive.idx_archive_leads_status
+        ON leads(status, created_at)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS archive.idx_archive_leads_lineage
+        ON leads(customer_id, project_category, initial_offer_number, revision)
+    ''')
+    # Visibility filters, as on main.leads
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS archive.idx_archive_leads_assigned
+        ON leads(assigned_sales_person, created_at)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS archive.idx_archive_leads_follow_up_by
+        ON leads(follow_up_by, created_at)
+    ''')
+    return [name for name, _ in columns]
+
+
+def archive_closed_leads(older_than_days=ARCHIVE_AFTER_DAYS):
+    """Move closed offers untouched for older_than_days into the archive database.
+
+    An offer moves as a whole (every revision) once its latest revision is in a
+    closed status and was last updated before the cutoff. Rows are copied and
+    deleted in one transaction spanning both files.
+    """
+    cutoff = (datetime.today() - timedelta(days=older_than_days)).strftime("%Y-%m-%d %H:%M:%S")
+    closed_placeholders = ", ".join("?" for _ in CLOSED_STATUSES)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('ATTACH DATABASE ? AS archive', (get_archive_path(),))
+        columns = ", ".join(_ensure_archive_schema(cursor))
+        conn.commit()
+
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(
+            f'''CREATE TEMP TABLE archiving AS
+               SELECT l.id FROM main.leads l
+               JOIN (SELECT customer_id, project_category, initial_offer_number
+                     FROM main.latest_leads
+                     WHERE status IN ({closed_placeholders}) AND updated_at < ?) closed
+               ON l.customer_id = closed.customer_id
+               AND l.project_category = closed.project_category
+               AND l.initial_offer_number = closed.initial_offer_number''',
+            (*CLOSED_STATUSES, cutoff)
+        )
+        cursor.execute(
+            f'''INSERT INTO archive.leads ({columns}, archived_at)
+               SELECT {columns}, CURRENT_TIMESTAMP FROM main.leads
+               WHERE id IN (SELECT id FROM temp.archiving)'''
+        )
+        moved = cursor.rowcount
+        cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM main.lead_changes')
+        last_seq = cursor.fetchone()[0]
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM main.lead_history')
+        last_history_id = cursor.fetchone()[0]
+        cursor.execute('DELETE FROM main.leads WHERE id IN (SELECT id FROM temp.archiving)')
+        # Downstream consumers must not treat archived leads as deleted, and
+        # they stay in the pipeline history
+        cursor.execute(
+            "UPDATE main.lead_changes SET operation = 'archive' WHERE seq > ? AND operation = 'delete'",
+            (last_seq,)
+        )
+        cursor.execute('DELETE FROM main.lead_history WHERE id > ? AND deleted = 1', (last_history_id,))
+        cursor.execute("UPDATE main.table_versions SET version = version + 1 WHERE table_name = 'leads_archive'")
+        cursor.execute('DROP TABLE temp.archiving')
+        conn.commit()
+        conn.close()
+        return True, f"Archived {moved} leads closed before {cutoff[:10]}"
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return False, str(e)
+
+
+# Pipeline Snapshot Functions
+def _replay_history(cursor, state, after_history_id, up_to):
+    """Apply lead_history rows after after_history_id (and changed up to `up_to`) to state"""
+    cursor.execute(
+        f'''SELECT id, lead_id, deleted, {", ".join(PIPELINE_FIELDS)} FROM lead_history
+           WHERE id > ? AND changed_at <= ?
+           ORDER BY id''',
+        (after_history_id, up_to)
+    )
+    last_id = after_history_id
+    for row in cursor:
+        last_id, lead_id, deleted = row[0], row[1], row[2]
+        if deleted:
+            state.pop(lead_id, None)
+        else:
+            state[lead_id] = row[3:]
+    return last_id
+
+
+def _load_checkpoint(cursor, up_to):
+    """Get (history_id, state) of the newest checkpoint taken at or before up_to"""
+    cursor.execute(
+        '''SELECT id, history_id FROM pipeline_checkpoints
+           WHERE taken_at <= ?
+           ORDER BY taken_at DESC
+           LIMIT 1''',
+        (up_to,)
+    )
+    checkpoint = cursor.fetchone()
+    if not checkpoint:
+        return 0, {}
+
+    cursor.execute(
+        f'''SELECT lead_id, {", ".join(PIPELINE_FIELDS)} FROM pipeline_checkpoint_leads
+           WHERE checkpoint_id = ?''',
+        (checkpoint[0],)
+    )
+    return checkpoint[1], {row[0]: row[1:] for row in cursor}
+
+
+def take_pipeline_checkpoint():
+    """Store the current pipeline state as a checkpoint.
+
+    Built from the previous checkpoint plus the history since then, so leads
+    moved to the archive stay in it.
+    """
+    now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        history_id, state = _load_checkpoint(cursor, now)
+        history_id = _replay_history(cursor, state, history_id, now)
+
+        cursor.execute(
+            'INSERT INTO pipeline_checkpoints (taken_at, history_id) VALUES (?, ?)',
+            (now, history_id)
+        )
+        checkpoint_id = cursor.lastrowid
+        placeholders = ", ".join("?" for _ in PIPELINE_FIELDS)
+        cursor.executemany(
+            f'''INSERT INTO pipeline_checkpoint_leads (checkpoint_id, lead_id, {", ".join(PIPELINE_FIELDS)})
+                VALUES (?, ?, {placeholders})''',
+            ((checkpoint_id, lead_id, *fields) for lead_id, fields in state.items())
+        )
+        conn.commit()
+        conn.close()
+        return True, f"Checkpoint of {len(state)} leads taken at {now} UTC"
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return False, str(e)
+
+
+def maybe_take_pipeline_checkpoint(interval_days=CHECKPOINT_INTERVAL_DAYS):
+    """Take a checkpoint if the newest one is older than interval_days"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT MAX(taken_at) FROM pipeline_checkpoints')
+    last_taken = cursor.fetchone()[0]
+    conn.close()
+
+    due = (datetime.utcnow() - timedelta(days=interval_days)).strftime("%Y-%m-%d %H:%M:%S")
+    if last_taken is None or last_taken <= due:
+        return take_pipeline_checkpoint()
+    return False, f"Last checkpoint taken at {last_taken} UTC"
+
+
+@cached_query("leads", "leads_archive", replica=True)
+def get_pipeline_as_of(as_of_date, scope=None):
+    """Get {status: (lead count, total offered value)} for the latest revisions as of the end of as_of_date.
+
+    Replays history from the nearest checkpoint at or before that time. The
+    day ends at the server's local midnight, converted to UTC because history
+    and checkpoint timestamps are UTC, like CURRENT_TIMESTAMP.
+    """
+    next_midnight = datetime.combine(as_of_date + timedelta(days=1), datetime.min.time()).astimezone(timezone.utc)
+    up_to = (next_midnight - timedelta(seconds=1)).strftime("%Y-%m-%d %H:%M:%S")
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    history_id, state = _load_checkpoint(cursor, up_to)
+    _replay_history(cursor, state, history_id, up_to)
+    conn.close()
+
+    fields = {name: index for index, name in enumerate(PIPELINE_FIELDS)}
+    summary = {}
+    for lead in state.values():
+        if not lead[fields["is_latest"]]:
+            continue
+        if scope is not None and lead[fields["assigned_sales_person"]] not in scope \
+                and lead[fields["follow_up_by"]] not in scope:
+            continue
+        count, value = summary.get(lead[fields["status"]], (0, 0.0))
+        summary[lead[fields["status"]]] = (count + 1, value + (lead[fields["offered_value"]] or 0.0))
+    return summary
+
+
+# Lead Scoring Functions
+def compute_lead_score(status, offered_value, follow_up_date, next_follow_up_date, win_rate, today):
+    """Score an open lead from 0 to 100; dates are ISO strings. Closed leads get None."""
+    if status in CLOSED_STATUSES:
+        return None
+    score = SCORE_STATUS_POINTS.get(status, 0)
+
+    if offered_value and offered_value > SCORE_VALUE_FLOOR:
+        score += SCORE_VALUE_POINTS * min(1.0, math.log10(offered_value / SCORE_VALUE_FLOOR) / 4)
+
+    score += SCORE_WIN_RATE_POINTS * (win_rate if win_rate is not None else 0.5)
+
+    today = datetime.fromisoformat(today)
+    if follow_up_date:
+        days_since = (today - datetime.fromisoformat(follow_up_date[:10])).days
+        score += min(SCORE_STALE_POINTS, max(0, days_since) / 3)
+    else:
+        score += SCORE_STALE_POINTS
+
+    if next_follow_up_date:
+        days_overdue = (today - datetime.fromisoformat(next_follow_up_date[:10])).days
+        if days_overdue > 0:
+            score += min(SCORE_OVERDUE_POINTS, 10 + days_overdue / 7)
+    return round(score, 1)
+
+
+def _score_leads(cursor, condition, params, today):
+    """Insert scores for the open latest-revision leads matching condition (on alias l)"""
+    cursor.connection.create_function("lead_score", 6, compute_lead_score, deterministic=True)
+    closed_placeholders = ", ".join("?" for _ in CLOSED_STATUSES)
+    cursor.execute(
+        f'''INSERT OR REPLACE INTO lead_scores (lead_id, assigned_sales_person, score, scored_on)
+           SELECT l.id, l.assigned_sales_person,
+                  lead_score(l.status, l.offered_value, l.follow_up_date, l.next_follow_up_date, w.win_rate, ?), ?
+           FROM leads l
+           LEFT JOIN category_win_rates w ON w.project_category = l.project_category
+           WHERE l.is_latest = 1 AND l.status NOT IN ({closed_placeholders}) AND {condition}''',
+        (today, today, *CLOSED_STATUSES, *params)
+    )
+
+
+def _rescore_offer(cursor, lead_id, today=None):
+    """Rescore every revision of the offer a lead belongs to after it changed"""
+    today = (today or datetime.now().date()).isoformat()
+    lineage = '''(customer_id, project_category, initial_offer_number) =
+                   (SELECT customer_id, project_category, initial_offer_number FROM leads WHERE id = ?)'''
+    cursor.execute(f'DELETE FROM lead_scores WHERE lead_id IN (SELECT id FROM leads WHERE {lineage})', (lead_id,))
+    # Also covers a lead whose category changed, which moved it to another lineage
+    cursor.execute('DELETE FROM lead_scores WHERE lead_id = ?', (lead_id,))
+    _score_leads(cursor, f"(l.customer_id, l.project_category, l.initial_offer_number) = "
+                         f"(SELECT customer_id, project_category, initial_offer_number FROM leads WHERE id = ?)",
+                 (lead_id,), today)
+
+
+def refresh_lead_scores(today=None):
+    """Recompute category win rates and the score of every open lead"""
+    today = (today or datetime.now().date()).isoformat()
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        # Win rates over closed offers, including archived ones; smoothed so
+        # that a category with few closed offers starts near 50%
+        source = "main.leads"
+        if _attach_archive(conn):
+            source = '''(SELECT project_category, status, is_latest FROM main.leads
+                        UNION ALL
+                        SELECT project_category, status, is_latest FROM archive.leads)'''
+        cursor.execute('DELETE FROM category_win_rates')
+        cursor.execute(
+            f'''INSERT INTO category_win_rates (project_category, won, closed, win_rate)
+               SELECT project_category, won, closed, (won + 1.0) / (closed + 2.0)
+               FROM (SELECT project_category,
+                            SUM(status IN ('Won', 'Completed')) AS won,
+                            SUM(status IN ('Won', 'Lost', 'Completed')) AS closed
+                     FROM {source}
+                     WHERE is_latest = 1
+                     GROUP BY project_category)'''
+        )
+        cursor.execute('DELETE FROM lead_scores')
+        _score_leads(cursor, "1 = 1", (), today)
+        scored = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return True, f"Scored {scored} open leads"
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return False, str(e)
+
+
+def maybe_refresh_lead_scores(today=None):
+    """Refresh the scores when some were computed before today (or none exist yet)"""
+    today = today or datetime.now().date()
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT MIN(scored_on) FROM lead_scores')
+    oldest = cursor.fetchone()[0]
+    if oldest is None:
+        cursor.execute(
+            f'''SELECT 1 FROM latest_leads
+                WHERE status NOT IN ({", ".join("?" for _ in CLOSED_STATUSES)}) LIMIT 1''',
+            CLOSED_STATUSES
+        )
+        stale = cursor.fetchone() is not None
+    else:
+        stale = oldest < today.isoformat()
+    conn.close()
+    if stale:
+        return refresh_lead_scores(today)
+    return False, "Scores are up to date"
+
+
+def get_rep_work_queue(sales_person, limit=20, today=None):
+    """Get a sales person's open leads with the highest scores first"""
+    maybe_refresh_lead_scores(today)
+    return _get_rep_work_queue(sales_person, limit)
+
+
+@cached_query("lead_scores", "leads", "customer_names")
+def _get_rep_work_queue(sales_person, limit):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        '''SELECT s.lead_id, c.name, l.project_category, l.status, l.offered_value,
+                  l.follow_up_date, l.next_follow_up_date, s.score
+           FROM lead_scores s
+           JOIN leads l ON l.id = s.lead_id
+           JOIN customers c ON c.id = l.customer_id
+           WHERE s.assigned_sales_person = ?
+           ORDER BY s.score DESC
+           LIMIT ?''',
+        (sales_person, limit)
+    )
+    queue = cursor.fetchall()
+    conn.close()
+    return queue
+
+
+# Report Job Functions
+def add_report_job(requested_by=None, total=0):
+    """Queue a report-pack job; return its id"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('INSERT INTO report_jobs (requested_by, total) VALUES (?, ?)', (requested_by, total))
+    job_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return job_id
+
+
+def update_report_job(job_id, status=None, progress=None, path=None, error=None):
+    """Record a report-pack job's progress; finished_at is set once it is done or failed"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        '''UPDATE report_jobs SET
+               status = COALESCE(?, status),
+               progress = COALESCE(?, progress),
+               path = COALESCE(?, path),
+               error = COALESCE(?, error),
+               finished_at = CASE WHEN ? IN ('done', 'failed') THEN CURRENT_TIMESTAMP ELSE finished_at END
+           WHERE id = ?''',
+        (status, progress, path, error, status, job_id)
+    )
+    conn.commit()
+    conn.close()
+
+
+@cached_query("report_jobs")
+def get_report_jobs(limit=20, requested_by=None):
+    """Get the most recent report-pack jobs, newest first; only one user's with requested_by"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    if requested_by is None:
+        cursor.execute(
+            '''SELECT id, requested_by, status, progress, total, path, error, created_at, finished_at
+               FROM report_jobs ORDER BY id DESC LIMIT ?''',
+            (limit,)
+        )
+    else:
+        cursor.execute(
+            '''SELECT id, requested_by, status, progress, total, path, error, created_at, finished_at
+               FROM report_jobs WHERE requested_by = ? ORDER BY id DESC LIMIT ?''',
+            (requested_by, limit)
+        )
+    jobs = cursor.fetchall()
+    conn.close()
+    return jobs
+
+
+# Group Functions
+def get_group_pipeline_summary():
+    """Get (tenant key, status, lead count, total offered value) over every business unit.
+
+    The unit files are ATTACHed read-only to one in-memory connection, up to
+    MAX_ATTACHED at a time, and summarized with one UNION ALL query per batch.
+    Latest revisions only; units whose file does not exist yet are left out.
+    """
+    tenants = [(key, tenant["db_path"]) for key, tenant in get_tenants().items()
+               if os.path.exists(tenant["db_path"])]
+    conn = sqlite3.connect("file::memory:", uri=True)
+    summary = []
+    try:
+        for start in range(0, len(tenants), MAX_ATTACHED):
+            batch = tenants[start:start + MAX_ATTACHED]
+            selects = []
+            params = []
+            for i, (key, db_path) in enumerate(batch):
+                conn.execute(f'ATTACH DATABASE ? AS t{i}', (f"{Path(db_path).resolve().as_uri()}?mode=ro",))
+                selects.append(f'''SELECT ?, status, COUNT(*), COALESCE(SUM(offered_value), 0)
+                                   FROM t{i}.leads WHERE is_latest = 1 GROUP BY status''')
+                params.append(key)
+            summary.extend(conn.execute(" UNION ALL ".join(selects), params).fetchall())
+            for i in range(len(batch)):
+                conn.execute(f'DETACH DATABASE t{i}')
+    finally:
+        conn.close()
+    return summary
@@ -0,0 +1,151 @@
+"""Data-quality scanner for the leads table.
+
+Splits the leads table into id ranges and runs every check on each range in
+a process pool. Each check is a single SQL statement over its range, so the
+work stays in SQLite's C code. The result is a report of issues, plus a SQL
+script with fixes for the issues that can be fixed automatically.
+
+Usage:
+    python manage.py scan [--workers 4] [--report issues.csv] [--fix-script fixes.sql]
+"""
+import csv
+import io
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import database as db
+
+PARTITION_SIZE = 50_000
+
+# Each check selects (lead_id, detail, fix statement or NULL) for leads with
+# id BETWEEN :lo AND :hi. The serial number expression mirrors
+# database.generate_serial_number(); keep the two in sync.
+CHECKS = {
+    "unknown_sales_person": (
+        "Assigned sales person, lead-through or follow-up person is not an employee",
+        """SELECT l.id,
+                  'assigned: ' || l.assigned_sales_person || ', lead through: ' || l.lead_through
+                  || ', follow-up: ' || COALESCE(l.follow_up_by, ''),
+                  NULL
+           FROM leads l
+           WHERE l.id BETWEEN :lo AND :hi
+           AND (NOT EXISTS (SELECT 1 FROM employees e WHERE e.name = l.assigned_sales_person)
+                OR NOT EXISTS (SELECT 1 FROM employees e WHERE e.name = l.lead_through)
+                OR (l.follow_up_by IS NOT NULL
+                    AND NOT EXISTS (SELECT 1 FROM employees e WHERE e.name = l.follow_up_by)))"""
+    ),
+    "serial_mismatch": (
+        "Serial number does not match the lead's current customer, category, date or offer numbers",
+        """SELECT id, 'has ' || serial_number || ', expected ' || expected,
+                  'UPDATE leads SET serial_number = ' || quote(expected) || ' WHERE id = ' || id || ';'
+           FROM (SELECT l.id, l.serial_number,
+                        :prefix || '/' || l.project_category || '/' || c.name || '/'
+                        || REPLACE(l.offer_created, '-', '') || '/' || l.initial_offer_number
+                        || '/' || l.offer_revision_number AS expected
+                 FROM leads l
+                 JOIN customers c ON c.id = l.customer_id
+                 WHERE l.id BETWEEN :lo AND :hi AND l.serial_number IS NOT NULL)
+           WHERE serial_number != expected"""
+    ),
+    "missing_next_follow_up": (
+        "Open lead (latest revision) has no next follow-up date",
+        """SELECT l.id, l.status,
+                  'UPDATE leads SET next_follow_up_date = date(''now'', ''+7 day'') WHERE id = ' || l.id || ';'
+           FROM leads l
+           WHERE l.id BETWEEN :lo AND :hi
+           AND l.is_latest = 1
+           AND l.next_follow_up_date IS NULL
+           AND l.status NOT IN ('Won', 'Lost', 'Completed')"""
+    ),
+    "revision_gap": (
+        "Offer revision has no previous revision (e.g. R3 without R2)",
+        """SELECT l.id, 'R' || l.revision || ' of offer ' || l.initial_offer_number || ' has no R' || (l.revision - 1),
+                  NULL
+           FROM leads l
+           WHERE l.id BETWEEN :lo AND :hi
+           AND l.revision > 1
+           AND NOT EXISTS (
+               SELECT 1 FROM leads p
+               WHERE p.customer_id = l.customer_id
+               AND p.project_category = l.project_category
+               AND p.initial_offer_number = l.initial_offer_number
+               AND p.revision = l.revision - 1)"""
+    ),
+}
+
+
+def get_partitions(db_path, partition_size=PARTITION_SIZE):
+    """Split the leads id range into (lo, hi) partitions"""
+    conn = sqlite3.connect(db_path)
+    low, high = conn.execute('SELECT MIN(id), MAX(id) FROM leads').fetchone()
+    conn.close()
+    if low is None:
+        return []
+    return [(lo, min(lo + partition_size - 1, high)) for lo in range(low, high + 1, partition_size)]
+
+
+def scan_partition(db_path, lo, hi, serial_prefix):
+    """Run every check on one id range; return (check, lead_id, detail, fix) tuples"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    issues = []
+    try:
+        for name, (_, query) in CHECKS.items():
+            for lead_id, detail, fix in conn.execute(query, {"lo": lo, "hi": hi, "prefix": serial_prefix}):
+                issues.append((name, lead_id, detail, fix))
+    finally:
+        conn.close()
+    return issues
+
+
+def _scan_partition_args(args):
+    return scan_partition(*args)
+
+
+def run_scan(db_path=None, workers=None, partition_size=PARTITION_SIZE, serial_prefix=None):
+    """Scan the leads table in parallel; return issues sorted by check and lead id"""
+    db_path = db_path or db.get_db_path()
+    serial_prefix = serial_prefix or db.get_serial_prefix()
+    partitions = get_partitions(db_path, partition_size)
+    if not partitions:
+        return []
+
+    workers = min(workers or os.cpu_count() or 1, len(partitions))
+    args = [(db_path, lo, hi, serial_prefix) for lo, hi in partitions]
+    if workers == 1:
+        results = map(_scan_partition_args, args)
+        return sorted(issue for result in results for issue in result)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_scan_partition_args, args)
+        return sorted(issue for result in results for issue in result)
+
+
+def summarize(issues):
+    """Get {check: issue count} for every check, including clean ones"""
+    summary = {name: 0 for name in CHECKS}
+    for name, _, _, _ in issues:
+        summary[name] += 1
+    return summary
+
+
+def build_report(issues):
+    """Get the issues as CSV text"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["check", "lead_id", "detail", "fixable"])
+    for name, lead_id, detail, fix in issues:
+        writer.writerow([name, lead_id, detail, "yes" if fix else "no"])
+    return output.getvalue()
+
+
+def build_fix_script(issues):
+    """Get a SQL script fixing the issues that have an automatic fix"""
+    lines = ["-- Generated by the CRM data-quality scanner. Review before running.", "BEGIN;"]
+    for name in CHECKS:
+        fixes = [fix for check, _, _, fix in issues if check == name and fix]
+        if fixes:
+            lines.append(f"\n-- {name}: {CHECKS[name][0]}")
+            lines.extend(fixes)
+    lines.append("COMMIT;")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,205 @@
+"""Simulate many concurrent app sessions against the data layer.
+
+Each session replays a weighted mix of the calls the pages make, the way a
+person clicking around the app would. Use it to check connection handling or
+locking changes before they reach production.
+
+Usage:
+    python loadtest.py --sessions 40 --duration 30 --leads 20000
+    python loadtest.py --mode process --sessions 8 --db existing.db
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, timedelta
+
+import database as db
+from sample_data import PRIORITIES, STATUSES, generate_sample_database
+
+# Relative frequency of each call in a session, roughly what the dashboard,
+# Lead Tracking and New Lead pages issue per rerun
+DEFAULT_MIX = {
+    "get_all_leads": 25,
+    "get_leads_needing_followup": 20,
+    "get_leads_by_status": 15,
+    "get_lead_by_id": 10,
+    "master_data": 20,
+    "add_lead": 5,
+    "update_lead": 5,
+}
+
+
+def _is_lock_error(message):
+    return "locked" in message or "busy" in message
+
+
+class Session:
+    """One simulated user replaying the call mix"""
+
+    def __init__(self, session_id, mix, seed):
+        self.rng = random.Random(seed)
+        self.operations = list(mix)
+        self.weights = [mix[op] for op in self.operations]
+        self.session_id = session_id
+        self.employees = db.get_all_employees()
+        self.customers = db.get_all_customers()
+        self.max_lead_id = max((lead[0] for lead in db.get_all_leads(include_revisions=True)), default=1)
+
+    def run_operation(self, operation):
+        """Run one call; return an error message for failed writes, else None"""
+        rng = self.rng
+        if operation == "get_all_leads":
+            db.get_all_leads()
+        elif operation == "get_leads_needing_followup":
+            db.get_leads_needing_followup(date.today())
+        elif operation == "get_leads_by_status":
+            db.get_leads_by_status(rng.choice(STATUSES))
+        elif operation == "get_lead_by_id":
+            db.get_lead_by_id(rng.randint(1, self.max_lead_id))
+        elif operation == "master_data":
+            db.get_all_employees()
+            db.get_all_customers()
+            db.get_customer_details(rng.choice(self.customers))
+        elif operation == "add_lead":
+            return self._add_lead()
+        elif operation == "update_lead":
+            success, message = db.update_lead(
+                rng.randint(1, self.max_lead_id),
+                status=rng.choice(STATUSES),
+                priority=rng.choice(PRIORITIES),
+                next_follow_up_date=date.today() + timedelta(days=rng.randint(1, 14))
+            )
+            return None if success else message
+        return None
+
+    def _add_lead(self):
+        # Same sequence of calls as the New Lead form
+        rng = self.rng
+        customer_name = rng.choice(self.customers)
+        category = rng.choice(db.get_all_project_categories())
+        customer_id = db.get_customer_id(customer_name)
+        offer_number = db.get_next_initial_offer_number(customer_name, category)
+        revision = db.get_next_offer_revision_number(customer_name, category, offer_number)
+        sales_person = rng.choice(self.employees)
+        success, message = db.add_lead(
+            customer_id, category, sales_person, date.today(), sales_person,
+            f"Load test session {self.session_id}", rng.choice(STATUSES), offer_number, revision,
+            rng.uniform(50_000, 5_000_000), rng.choice(PRIORITIES), sales_person, "",
+            date.today(), date.today() + timedelta(days=7)
+        )
+        return None if success else message
+
+    def run(self, deadline, think_time):
+        """Run operations until deadline; return (operation, seconds, error) samples"""
+        samples = []
+        while time.perf_counter() < deadline:
+            operation = self.rng.choices(self.operations, weights=self.weights)[0]
+            started = time.perf_counter()
+            try:
+                error = self.run_operation(operation)
+            except sqlite3.Error as e:
+                error = str(e)
+            samples.append((operation, time.perf_counter() - started, error))
+            if think_time:
+                time.sleep(self.rng.uniform(0, 2 * think_time))
+        return samples
+
+
+def _run_session(db_path, session_id, mix, duration, think_time, start_barrier=None):
+    db.DB_PATH = db_path
+    db.ensure_database()
+    session = Session(session_id, mix, seed=session_id)
+    if start_barrier is not None:
+        start_barrier.wait()
+    return session.run(time.perf_counter() + duration, think_time)
+
+
+def _run_process_session(args):
+    # Sessions in separate processes cannot share a barrier cheaply; they
+    # start as soon as the pool hands them out
+    return _run_session(*args)
+
+
+def run_load_test(db_path, sessions=40, duration=30.0, mode="thread", mix=None, think_time=0.0):
+    """Run the load test and return the list of (operation, seconds, error) samples"""
+    mix = mix or DEFAULT_MIX
+    if mode == "process":
+        with ProcessPoolExecutor(max_workers=sessions) as pool:
+            results = pool.map(
+                _run_process_session,
+                [(db_path, i, mix, duration, think_time) for i in range(sessions)]
+            )
+            return [sample for result in results for sample in result]
+
+    barrier = threading.Barrier(sessions)
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        futures = [
+            pool.submit(_run_session, db_path, i, mix, duration, think_time, barrier)
+            for i in range(sessions)
+        ]
+        return [sample for future in futures for sample in future.result()]
+
+
+def _percentile(values, pct):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def format_report(samples, duration):
+    """Format throughput, latency percentiles and error counts per operation"""
+    lines = [
+        f"{'operation':<28}{'calls':>8}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'locked':>8}{'errors':>8}"
+    ]
+    by_operation = {}
+    for operation, seconds, error in samples:
+        by_operation.setdefault(operation, []).append((seconds, error))
+
+    def row(name, entries):
+        latencies = sorted(seconds * 1000 for seconds, _ in entries)
+        locked = sum(1 for _, error in entries if error and _is_lock_error(error))
+        errors = sum(1 for _, error in entries if error) - locked
+        return (f"{name:<28}{len(entries):>8}{len(entries) / duration:>10.1f}"
+                f"{_percentile(latencies, 50):>10.2f}{_percentile(latencies, 99):>10.2f}{locked:>8}{errors:>8}")
+
+    for operation in sorted(by_operation):
+        lines.append(row(operation, by_operation[operation]))
+    if samples:
+        lines.append(row("TOTAL", [(seconds, error) for _, seconds, error in samples]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the CRM data layer")
+    parser.add_argument("--sessions", type=int, default=40, help="Number of concurrent sessions")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread",
+                        help="Run sessions as threads of one server process or as separate processes")
+    parser.add_argument("--think-time", type=float, default=0.0,
+                        help="Mean pause in seconds between a session's calls")
+    parser.add_argument("--db", help="Use an existing database instead of generating one (test leads are written to it)")
+    parser.add_argument("--leads", type=int, default=20000, help="Leads to generate")
+    parser.add_argument("--customers", type=int, default=500, help="Customers to generate")
+    parser.add_argument("--employees", type=int, default=40, help="Employees to generate")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = args.db
+        if not db_path:
+            db_path = os.path.join(tmpdir, "loadtest.db")
+            count = generate_sample_database(db_path, args.leads, args.customers, args.employees)
+            print(f"Generated {count} leads in {db_path}")
+
+        print(f"Running {args.sessions} {args.mode} sessions for {args.duration:.0f}s...")
+        samples = run_load_test(db_path, args.sessions, args.duration, args.mode, think_time=args.think_time)
+        print(format_report(samples, args.duration))
+
+
+if __name__ == "__main__":
+    main()
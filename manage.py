@@ -0,0 +1,206 @@
+"""Command-line maintenance tasks for the CRM database.
+
+Usage:
+    python manage.py archive [--days 365]
+    python manage.py changes --state-file warehouse.state [--output changes.jsonl]
+    python manage.py checkpoint [--force]
+    python manage.py scan [--workers 4] [--report issues.csv] [--fix-script fixes.sql]
+    python manage.py report [--output-dir reports]
+    python manage.py reminders [--dry-run] [--date 2024-05-01]
+    python manage.py scores
+    python manage.py create-admin <username>
+
+With a tenants file, pick the business unit with --tenant <key> before the command.
+"""
+import argparse
+import getpass
+import json
+import os
+import sys
+import time
+from datetime import date
+
+import database as db
+import dataquality
+import reminders
+import reports
+
+
+def archive(args):
+    """Move closed leads into the archive database"""
+    success, message = db.archive_closed_leads(args.days)
+    print(message)
+    return 0 if success else 1
+
+
+def export_changes(args):
+    """Write lead changes after the watermark as JSON lines, batch by batch"""
+    since_seq = args.since
+    if since_seq is None and args.state_file and os.path.exists(args.state_file):
+        with open(args.state_file) as f:
+            since_seq = int(f.read().strip() or 0)
+    since_seq = since_seq or 0
+
+    output = open(args.output, "a") if args.output else sys.stdout
+    exported = 0
+    try:
+        while True:
+            changes, next_seq, has_more = db.get_lead_changes(since_seq, args.batch_size)
+            for change in changes:
+                output.write(json.dumps(change, default=str) + "\n")
+            output.flush()
+            exported += len(changes)
+            since_seq = next_seq
+
+            # Save the watermark after every batch so an interrupted export resumes here
+            if args.state_file:
+                tmp_path = f"{args.state_file}.tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(str(since_seq))
+                os.replace(tmp_path, args.state_file)
+
+            if not has_more:
+                break
+    finally:
+        if args.output:
+            output.close()
+
+    if args.prune:
+        db.prune_lead_changes(since_seq)
+    print(f"Exported {exported} changes up to seq {since_seq}", file=sys.stderr)
+    return 0
+
+
+def checkpoint(args):
+    """Take a pipeline checkpoint if one is due (or always with --force)"""
+    if args.force:
+        success, message = db.take_pipeline_checkpoint()
+    else:
+        success, message = db.maybe_take_pipeline_checkpoint(args.interval_days)
+    print(message)
+    return 0
+
+
+def scan(args):
+    """Run the data-quality scanner and print a summary"""
+    started = time.perf_counter()
+    issues = dataquality.run_scan(workers=args.workers)
+    elapsed = time.perf_counter() - started
+
+    for name, count in dataquality.summarize(issues).items():
+        print(f"{name:<28}{count:>8}")
+    print(f"{len(issues)} issues found in {elapsed:.2f}s")
+
+    if args.report:
+        with open(args.report, "w", newline="") as f:
+            f.write(dataquality.build_report(issues))
+        print(f"Report written to {args.report}")
+    if args.fix_script:
+        with open(args.fix_script, "w") as f:
+            f.write(dataquality.build_fix_script(issues))
+        print(f"Fix script written to {args.fix_script}")
+    return 1 if issues else 0
+
+
+def report(args):
+    """Build a report pack in this process (for schedulers such as cron)"""
+    job_id = db.add_report_job("manage.py", total=len(reports.REPORTS))
+    pack_path = reports.generate_report_pack(db.get_tenant(), job_id,
+                                             report_dir=args.output_dir or reports.get_report_dir())
+    print(f"Report pack written to {pack_path}")
+    return 0
+
+
+def send_reminders(args):
+    """Email today's follow-up digests that have not been sent yet"""
+    sent, skipped, failed = reminders.send_reminders(args.date, dry_run=args.dry_run)
+    print(f"{len(sent)} digests {'rendered' if args.dry_run else 'sent'}", file=sys.stderr)
+    if skipped:
+        print(f"No email address for: {', '.join(skipped)}", file=sys.stderr)
+    for person, error in failed:
+        print(f"Failed for {person}: {error}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def scores(args):
+    """Recompute category win rates and every open lead's score"""
+    success, message = db.refresh_lead_scores()
+    print(message)
+    return 0 if success else 1
+
+
+def create_admin(args):
+    """Create an administrator account, e.g. the first one (the login form cannot)"""
+    # auth imports streamlit, which only this command needs
+    import auth
+
+    password = getpass.getpass(f"Password for {args.username}: ")
+    if not password or password != getpass.getpass("Repeat password: "):
+        print("Passwords are empty or do not match", file=sys.stderr)
+        return 1
+    success, message = db.add_user(args.username, auth.hash_password(password), "admin")
+    print(message)
+    return 0 if success else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CRM maintenance tasks")
+    parser.add_argument("--db", default=db.DB_PATH, help="Path of the CRM database")
+    parser.add_argument("--tenant", help="Business unit from the tenants file (overrides --db)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    archive_parser = subparsers.add_parser("archive", help="Move closed leads into the archive database")
+    archive_parser.add_argument(
+        "--days", type=int, default=db.ARCHIVE_AFTER_DAYS,
+        help="Archive offers closed and untouched for at least this many days"
+    )
+    archive_parser.set_defaults(func=archive)
+
+    changes_parser = subparsers.add_parser("changes", help="Export lead changes since a watermark")
+    changes_parser.add_argument("--since", type=int, help="Export changes after this seq (overrides --state-file)")
+    changes_parser.add_argument("--state-file", help="File holding the watermark; updated after every batch")
+    changes_parser.add_argument("--output", help="Append JSON lines to this file instead of stdout")
+    changes_parser.add_argument("--batch-size", type=int, default=1000)
+    changes_parser.add_argument("--prune", action="store_true",
+                                help="Delete exported changes from the feed afterwards (single consumer only)")
+    changes_parser.set_defaults(func=export_changes)
+
+    checkpoint_parser = subparsers.add_parser("checkpoint", help="Take a pipeline snapshot checkpoint")
+    checkpoint_parser.add_argument("--force", action="store_true", help="Take one even if the last is recent")
+    checkpoint_parser.add_argument("--interval-days", type=int, default=db.CHECKPOINT_INTERVAL_DAYS)
+    checkpoint_parser.set_defaults(func=checkpoint)
+
+    scan_parser = subparsers.add_parser("scan", help="Scan leads for data-quality issues")
+    scan_parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    scan_parser.add_argument("--report", help="Write all issues to this CSV file")
+    scan_parser.add_argument("--fix-script", help="Write SQL fixes for fixable issues to this file")
+    scan_parser.set_defaults(func=scan)
+
+    report_parser = subparsers.add_parser("report", help="Build a report pack of lead summaries")
+    report_parser.add_argument("--output-dir", help="Directory for the pack (default: reports/[<tenant>])")
+    report_parser.set_defaults(func=report)
+
+    reminders_parser = subparsers.add_parser("reminders", help="Email follow-up digests to each person")
+    reminders_parser.add_argument("--date", type=date.fromisoformat, help="Digest date (default: today)")
+    reminders_parser.add_argument("--dry-run", action="store_true", help="Print the digests instead of sending them")
+    reminders_parser.set_defaults(func=send_reminders)
+
+    scores_parser = subparsers.add_parser("scores", help="Refresh lead scores and category win rates")
+    scores_parser.set_defaults(func=scores)
+
+    create_admin_parser = subparsers.add_parser("create-admin", help="Create an administrator account")
+    create_admin_parser.add_argument("username")
+    create_admin_parser.set_defaults(func=create_admin)
+
+    args = parser.parse_args(argv)
+    db.DB_PATH = args.db
+    try:
+        db.set_tenant(args.tenant)
+    except ValueError as e:
+        parser.error(str(e))
+    db.ensure_database()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,5 +1,6 @@
 import streamlit as st
 from datetime import datetime
+import auth
 import database as db
 
 def show_employee_management():
@@ -14,11 +15,12 @@ def show_employee_management():
             name = st.text_input("Employee Name")
             email = st.text_input("Email")
             phone = st.text_input("Phone")
+            team = st.text_input("Team")
             submitted = st.form_submit_button("Add Employee")
             
             if submitted:
                 if name:
-                    success, message = db.add_employee(name, email, phone)
+                    success, message = db.add_employee(name, email, phone, team)
                     if success:
                         st.success(message)
                         st.rerun()
@@ -29,12 +31,13 @@ def show_employee_management():
     
     with tab2:
         employees = db.get_all_employees()
+        teams = db.get_employee_teams()
         if employees:
             st.write("**Current Employees:**")
             for emp in employees:
                 col1, col2 = st.columns([0.9, 0.1])
                 with col1:
-                    st.write(emp)
+                    st.write(f"{emp} ({teams[emp]})" if teams.get(emp) else emp)
                 with col2:
                     if st.button("🗑️", key=f"del_emp_{emp}"):
                         db.delete_employee(emp)
@@ -42,6 +45,21 @@ def show_employee_management():
                         st.rerun()
         else:
             st.info("No employees added yet")
+        
+        if employees:
+            with st.form("employee_team_form"):
+                st.write("**Change Team**")
+                col1, col2 = st.columns(2)
+                with col1:
+                    team_employee = st.selectbox("Employee", employees)
+                with col2:
+                    new_team = st.text_input("Team")
+                submitted = st.form_submit_button("Update Team")
+                
+                if submitted:
+                    success, message = db.update_employee_team(team_employee, new_team)
+                    st.success(message)
+                    st.rerun()
 
 
 def show_customer_management():
@@ -105,6 +123,48 @@ def show_customer_management():
             st.info("No customers available")
 
 
+def show_user_management(current_user):
+    """User Management Section"""
+    st.header("User Management")
+    
+    tab1, tab2 = st.tabs(["Add User", "View Users"])
+    
+    with tab1:
+        st.subheader("Add New User")
+        employees = db.get_all_employees()
+        with st.form("add_user_form"):
+            username = st.text_input("Username")
+            password = st.text_input("Password", type="password")
+            role = st.selectbox("Role", list(db.USER_ROLES), format_func=lambda r: r.replace("_", " ").title())
+            employee_name = st.selectbox("Employee", [""] + employees, help="Reps and team leads see leads of this employee (and their team)")
+            submitted = st.form_submit_button("Add User")
+            
+            if submitted:
+                if not username or not password:
+                    st.error("Please enter a username and password")
+                elif role != "admin" and not employee_name:
+                    st.error("Reps and team leads must be linked to an employee")
+                else:
+                    success, message = db.add_user(username, auth.hash_password(password), role, employee_name)
+                    if success:
+                        st.success(message)
+                        st.rerun()
+                    else:
+                        st.error(message)
+    
+    with tab2:
+        users = db.get_all_users()
+        for username, role, employee_name in users:
+            col1, col2 = st.columns([0.9, 0.1])
+            with col1:
+                st.write(f"{username} - {role.replace('_', ' ')}" + (f" ({employee_name})" if employee_name else ""))
+            with col2:
+                if username != current_user["username"] and st.button("🗑️", key=f"del_user_{username}"):
+                    db.delete_user(username)
+                    st.success(f"Deleted {username}")
+                    st.rerun()
+
+
 def show_project_category_management():
     """Project Category Management Section"""
     st.header("Project Category Management")
@@ -118,16 +178,20 @@ def show_project_category_management():
 
 
 if __name__ == "__main__":
-    # Initialize database
-    db.init_database()
-    
     st.set_page_config(page_title="CRM Master Data", layout="wide")
+    user = auth.require_login()
     st.title("CRM - Master Data Management")
     
-    tab1, tab2, tab3 = st.tabs(["Employees", "Customers", "Project Categories"])
-    
-    with tab1:
-        show_employee_management()
+    if auth.is_admin(user):
+        tab1, tab2, tab3, tab4 = st.tabs(["Employees", "Customers", "Project Categories", "Users"])
+        
+        with tab1:
+            show_employee_management()
+        
+        with tab4:
+            show_user_management(user)
+    else:
+        tab2, tab3 = st.tabs(["Customers", "Project Categories"])
     
     with tab2:
         show_customer_management()
@@ -1,13 +1,16 @@
 import streamlit as st
 from datetime import datetime
+import auth
 import database as db
 
-def show_new_lead_form():
+def show_new_lead_form(scope=None):
     """Display the lead creation form"""
     st.header("New Lead Entry")
     
     # Get reference data
     employees = db.get_all_employees()
+    # Reps and team leads can only assign leads they will be able to see
+    assignable_employees = [emp for emp in employees if scope is None or emp in scope]
     customers = db.get_all_customers()
     categories = db.get_all_project_categories()
     statuses = ["Connected", "Technical Analysis", "Price Offered", "Won", "Completed", "Lost"]
@@ -45,7 +48,7 @@ def show_new_lead_form():
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            assigned_sales_person = st.selectbox("Assigned Sales Person", employees if employees else ["No employees"])
+            assigned_sales_person = st.selectbox("Assigned Sales Person", assignable_employees if assignable_employees else ["No employees"])
         
         with col2:
             offer_created = st.date_input("Offer Created", value=datetime.today())
@@ -173,10 +176,8 @@ def show_new_lead_form():
 
 
 if __name__ == "__main__":
-    # Initialize database
-    db.init_database()
-    
     st.set_page_config(page_title="CRM - New Lead", layout="wide")
+    user = auth.require_login()
     st.title("CRM - Lead Management")
     
-    show_new_lead_form()
+    show_new_lead_form(auth.get_scope(user))
@@ -1,13 +1,20 @@
 import streamlit as st
 from datetime import datetime
 import pandas as pd
+import attachments
+import auth
 import database as db
 
-def show_all_leads():
+def show_all_leads(user, scope=None):
     """Display all leads in a table"""
     st.header("All Leads")
     
-    leads = db.get_all_leads()
+    col1, col2 = st.columns(2)
+    with col1:
+        show_revisions = st.checkbox("Show superseded offer revisions")
+    with col2:
+        show_archived = st.checkbox("Include archived leads", key="all_leads_archived")
+    leads = db.get_all_leads(include_revisions=show_revisions, include_archive=show_archived, scope=scope)
     
     if leads:
         # Prepare data for display
@@ -32,17 +39,30 @@ def show_all_leads():
         st.dataframe(df, use_container_width=True)
         
         # Allow selection and editing
-        selected_id = st.selectbox("Select a lead to view/edit details", [lead[0] for lead in leads])
+        selected_id = select_lead("all_leads", scope, include_revisions=show_revisions,
+                                  include_archive=show_archived)
         
         if selected_id:
-            show_lead_details(selected_id)
+            show_lead_details(selected_id, user, scope)
     else:
         st.info("No leads found. Create a new lead to get started.")
 
 
-def show_lead_details(lead_id):
+def select_lead(key, scope=None, include_revisions=False, include_archive=False):
+    """Pick a lead through a search box; return its ID, or None when nothing matches"""
+    term = st.text_input("Search by lead ID or customer name", key=f"{key}_search")
+    options = dict(db.search_lead_options(term, include_revisions=include_revisions,
+                                          include_archive=include_archive, scope=scope))
+    if not options:
+        st.info("No matching leads")
+        return None
+    return st.selectbox(f"Select a lead to view/edit details (newest {len(options)} matches)", list(options),
+                        format_func=options.get, key=f"{key}_select")
+
+
+def show_lead_details(lead_id, user, scope=None):
     """Display and allow editing of lead details"""
-    lead = db.get_lead_by_id(lead_id)
+    lead = db.get_lead_by_id(lead_id, scope=scope)
     
     if lead:
         st.divider()
@@ -104,6 +124,36 @@ def show_lead_details(lead_id):
         if lead_dict['serial_number']:
             st.info(f"**Serial Number:** {lead_dict['serial_number']}")
         
+        archived = db.is_archived_lead(lead_id)
+        show_lead_attachments(lead_id, user, allow_upload=not archived)
+        
+        if archived:
+            st.info("This lead has been archived and is read-only.")
+            return
+        
+        # Offer revisions
+        st.divider()
+        st.subheader("Offer Revisions")
+        
+        revisions = db.get_offer_revisions(lead_id)
+        df = pd.DataFrame([{
+            "ID": rev[0],
+            "Revision": rev[1],
+            "Offer Date": rev[2],
+            "Status": rev[3],
+            "Offered Value (BDT)": rev[4],
+            "Latest": "✅" if rev[5] else ""
+        } for rev in revisions])
+        st.dataframe(df, use_container_width=True, hide_index=True)
+        
+        if st.button("📝 Revise Offer", key=f"revise_lead_{lead_id}"):
+            success, message = db.revise_lead(lead_id)
+            if success:
+                st.success(message)
+                st.rerun()
+            else:
+                st.error(f"Error: {message}")
+        
         # Edit form
         st.divider()
         st.subheader("Update Lead")
@@ -191,14 +241,150 @@ def show_lead_details(lead_id):
                     st.error(f"Error: {message}")
 
 
-def show_leads_by_status():
-    """Display leads grouped by status"""
-    st.header("Leads by Status")
+def show_lead_attachments(lead_id, user, allow_upload=True):
+    """List, download and upload a lead's attachments"""
+    st.divider()
+    st.subheader("Attachments")
+    
+    lead_attachments = db.get_lead_attachments(lead_id)
+    if lead_attachments:
+        df = pd.DataFrame([{
+            "File": att[1],
+            "Size (KB)": round(att[2] / 1024, 1),
+            "Uploaded": att[4],
+            "Uploaded By": att[6] or "-"
+        } for att in lead_attachments])
+        st.dataframe(df, use_container_width=True, hide_index=True)
+        
+        names = {att[0]: att[1] for att in lead_attachments}
+        col1, col2, col3 = st.columns([0.6, 0.2, 0.2])
+        with col1:
+            selected_attachment = st.selectbox(
+                "Select attachment",
+                list(names),
+                format_func=lambda x: names[x],
+                key=f"attachment_select_{lead_id}"
+            )
+        # Only the selected file is read, so reruns do not load every document
+        attachment, data = attachments.read_attachment(selected_attachment)
+        with col2:
+            if attachment and data is None:
+                st.warning("File missing from the attachment store")
+            elif attachment:
+                st.download_button(
+                    "⬇️ Download",
+                    data=data,
+                    file_name=attachment[2],
+                    mime=attachment[4] or "application/octet-stream",
+                    key=f"attachment_download_{lead_id}"
+                )
+        with col3:
+            if allow_upload and st.button("🗑️ Delete", key=f"attachment_delete_{lead_id}"):
+                attachments.delete_attachment(selected_attachment)
+                st.rerun()
+    else:
+        st.info("No attachments for this lead")
+    
+    if allow_upload:
+        uploaded_file = st.file_uploader("Attach a document", key=f"attachment_upload_{lead_id}")
+        if uploaded_file is not None and st.button("📎 Upload", key=f"attachment_upload_button_{lead_id}"):
+            success, message = attachments.add_attachment(
+                lead_id, uploaded_file, uploaded_file.name, uploaded_file.type, user["username"]
+            )
+            if success:
+                st.success(message)
+                st.rerun()
+            else:
+                st.error(f"Error: {message}")
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+def show_lead_search(user, scope=None):
+    """Filter leads on several criteria at once, with saved views"""
+    st.header("Search Leads")
+    
+    saved_views = db.get_saved_views(user["username"])
+    view_name = st.selectbox("Saved View", ["(none)"] + list(saved_views))
+    view = saved_views.get(view_name, {})
+    # Widget keys include the view name so that picking a view resets the filters
+    key = f"search_{view_name}"
     
     statuses = ["Connected", "Technical Analysis", "Price Offered", "Won", "Completed", "Lost"]
-    selected_status = st.selectbox("Select Status", statuses)
+    priorities = ["P-1", "P-2", "P-3", "P-4"]
+    sales_persons = db.get_all_employees() if scope is None else list(scope)
+    categories = db.get_all_project_categories()
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        selected_statuses = st.multiselect("Status", statuses, default=[
+            status for status in view.get("statuses", []) if status in statuses], key=f"{key}_statuses")
+    with col2:
+        selected_sales_persons = st.multiselect("Sales Person", sales_persons, default=[
+            name for name in view.get("sales_persons", []) if name in sales_persons], key=f"{key}_sales_persons")
+    with col3:
+        selected_categories = st.multiselect("Category", categories, default=[
+            category for category in view.get("categories", []) if category in categories], key=f"{key}_categories")
+    with col4:
+        selected_priorities = st.multiselect("Priority", priorities, default=[
+            priority for priority in view.get("priorities", []) if priority in priorities], key=f"{key}_priorities")
     
-    leads = db.get_leads_by_status(selected_status)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        offer_from = st.date_input("Offer Date From", value=_parse_date(view.get("offer_from")), key=f"{key}_offer_from")
+        offer_to = st.date_input("Offer Date To", value=_parse_date(view.get("offer_to")), key=f"{key}_offer_to")
+    with col2:
+        next_follow_up_from = st.date_input("Next Follow-up From", value=_parse_date(view.get("next_follow_up_from")),
+                                            key=f"{key}_next_follow_up_from")
+        next_follow_up_to = st.date_input("Next Follow-up To", value=_parse_date(view.get("next_follow_up_to")),
+                                          key=f"{key}_next_follow_up_to")
+    with col3:
+        min_value = st.number_input("Min Value (BDT)", min_value=0.0, value=float(view.get("min_value", 0.0)),
+                                    key=f"{key}_min_value")
+        max_value = st.number_input("Max Value (BDT, 0 = no limit)", min_value=0.0,
+                                    value=float(view.get("max_value", 0.0)), key=f"{key}_max_value")
+    with col4:
+        overdue = st.checkbox("Overdue follow-ups only", value=view.get("overdue", False), key=f"{key}_overdue")
+        show_revisions = st.checkbox("Show superseded offer revisions", key=f"{key}_revisions")
+        show_archived = st.checkbox("Include archived leads", key=f"{key}_archived")
+    
+    filters = {
+        "statuses": selected_statuses,
+        "sales_persons": selected_sales_persons,
+        "categories": selected_categories,
+        "priorities": selected_priorities,
+        "offer_from": offer_from,
+        "offer_to": offer_to,
+        "next_follow_up_from": next_follow_up_from,
+        "next_follow_up_to": next_follow_up_to,
+        "min_value": min_value or None,
+        "max_value": max_value or None,
+        "overdue": overdue
+    }
+    
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        new_view_name = st.text_input("View Name", value="" if view_name == "(none)" else view_name)
+    with col2:
+        st.write("")
+        if st.button("💾 Save View"):
+            success, message = db.save_view(user["username"], new_view_name, filters)
+            if success:
+                st.success(message)
+                st.rerun()
+            else:
+                st.error(message)
+    with col3:
+        st.write("")
+        if view_name != "(none)" and st.button("🗑️ Delete View"):
+            db.delete_saved_view(user["username"], view_name)
+            st.rerun()
+    
+    max_rows = 1000
+    leads = db.search_leads(filters, datetime.today().date(), include_revisions=show_revisions,
+                            include_archive=show_archived, scope=scope, limit=max_rows)
     
     if leads:
         df_data = []
@@ -209,23 +395,29 @@ def show_leads_by_status():
                 "Category": lead[2],
                 "Sales Person": lead[3],
                 "Offer Date": lead[4],
+                "Status": lead[5],
+                "Initial Offer #": lead[6],
+                "Revision": lead[7],
                 "Priority": lead[8],
                 "Follow-up Date": lead[9],
+                "Next Follow-up": lead[10],
                 "Serial Number": lead[11]
             })
         
         df = pd.DataFrame(df_data)
         st.dataframe(df, use_container_width=True)
+        if len(leads) == max_rows:
+            st.caption(f"Showing the newest {max_rows:,} matching leads; narrow the filters to see older ones.")
     else:
-        st.info(f"No leads with status: {selected_status}")
+        st.info("No leads match these filters")
 
 
-def show_followup_reminders():
+def show_followup_reminders(scope=None):
     """Display leads needing follow-up"""
     st.header("Follow-up Reminders")
     
     today = datetime.today().date()
-    leads = db.get_leads_needing_followup(today)
+    leads = db.get_leads_needing_followup(today, scope=scope)
     
     if leads:
         st.warning(f"**{len(leads)} leads need follow-up today or earlier!**")
@@ -248,33 +440,60 @@ def show_followup_reminders():
         st.success("No leads needing follow-up")
 
 
-if __name__ == "__main__":
-    # Initialize database
-    db.init_database()
-    
-    st.set_page_config(page_title="CRM - Lead Tracking", layout="wide")
-    st.title("CRM - Lead Tracking & Follow-ups")
-    
-    tab1, tab2, tab3, tab4 = st.tabs(["All Leads", "Leads by Status", "Follow-up Reminders", "Edit Lead"])
+def show_work_queue(scope=None):
+    """Display a sales person's open leads, highest score first"""
+    st.header("Work Queue")
     
-    with tab1:
-        show_all_leads()
+    sales_persons = db.get_all_employees() if scope is None else list(scope)
+    if not sales_persons:
+        st.info("Your account is not linked to an employee")
+        return
+    if len(sales_persons) == 1:
+        sales_person = sales_persons[0]
+    else:
+        sales_person = st.selectbox("Sales Person", sales_persons)
     
-    with tab2:
-        show_leads_by_status()
+    leads = db.get_rep_work_queue(sales_person, limit=25)
     
-    with tab3:
-        show_followup_reminders()
+    if leads:
+        st.caption("Scores weigh status, offered value, the category's win rate, days since the last "
+                   "follow-up and overdue next follow-ups.")
+        df = pd.DataFrame([{
+            "ID": lead[0],
+            "Customer": lead[1],
+            "Category": lead[2],
+            "Status": lead[3],
+            "Offered Value (BDT)": lead[4],
+            "Follow-up Date": lead[5],
+            "Next Follow-up": lead[6],
+            "Score": lead[7]
+        } for lead in leads])
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    else:
+        st.success(f"No open leads assigned to {sales_person}")
+
+
+def show_edit_lead(user, scope=None):
+    """Pick any lead and edit it"""
+    st.subheader("Edit Specific Lead")
+    selected_id = select_lead("edit_lead", scope)
+    if selected_id:
+        show_lead_details(selected_id, user, scope)
+
+
+if __name__ == "__main__":
+    st.set_page_config(page_title="CRM - Lead Tracking", layout="wide")
+    user = auth.require_login()
+    scope = auth.get_scope(user)
+    st.title("CRM - Lead Tracking & Follow-ups")
     
-    with tab4:
-        st.subheader("Edit Specific Lead")
-        leads = db.get_all_leads()
-        if leads:
-            selected_id = st.selectbox(
-                "Select Lead to Edit",
-                [lead[0] for lead in leads],
-                format_func=lambda x: f"ID {x} - {[l[1] for l in leads if l[0] == x][0]}"
-            )
-            show_lead_details(selected_id)
-        else:
-            st.info("No leads available")
+    # Only the selected view runs its queries; st.tabs would run all four on every rerun
+    views = {
+        "Work Queue": lambda: show_work_queue(scope),
+        "All Leads": lambda: show_all_leads(user, scope),
+        "Search Leads": lambda: show_lead_search(user, scope),
+        "Follow-up Reminders": lambda: show_followup_reminders(scope),
+        "Edit Lead": lambda: show_edit_lead(user, scope)
+    }
+    view = st.radio("View", list(views), horizontal=True, label_visibility="collapsed")
+    views[view]()
@@ -0,0 +1,87 @@
+import streamlit as st
+import pandas as pd
+import auth
+import database as db
+
+def show_customer_contact(customer_name):
+    """Display the customer's contact details"""
+    details = db.get_customer_details(customer_name)
+    if not details:
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.write(f"**Contact Person:** {details['contact_person'] or '-'}")
+    with col2:
+        st.write(f"**Email:** {details['email'] or '-'}")
+    with col3:
+        st.write(f"**Phone:** {details['phone'] or '-'}")
+    with col4:
+        st.write(f"**Address:** {details['address'] or '-'}")
+
+
+def show_customer_offers(customer_name, scope=None):
+    """Display every offer of a customer with its revisions and follow-ups"""
+    include_archive = st.checkbox("Include archived leads", key="customer_360_archived")
+    offers = db.get_customer_offer_summary(db.get_customer_id(customer_name), scope=scope,
+                                           include_archive=include_archive)
+
+    if not offers:
+        st.info("No offers found for this customer")
+        return
+
+    # Totals are over the latest revision of each offer
+    open_offers = [offer for offer in offers if offer[4] not in db.CLOSED_STATUSES]
+    total_value = sum(offer[5] or 0 for offer in offers)
+    won_value = sum(offer[5] or 0 for offer in offers if offer[4] in ("Won", "Completed"))
+    follow_up_dates = [offer[6] for offer in offers if offer[6]]
+    next_follow_up_dates = [offer[7] for offer in offers if offer[7]]
+
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.metric("Offers", len(offers))
+    with col2:
+        st.metric("Open Offers", len(open_offers))
+    with col3:
+        st.metric("Total Offered", f"{total_value:,.2f}")
+    with col4:
+        st.metric("Won Value", f"{won_value:,.2f}")
+    with col5:
+        st.metric("Next Follow-up", min(next_follow_up_dates) if next_follow_up_dates else "-")
+
+    if follow_up_dates:
+        st.caption(f"Last follow-up: {max(follow_up_dates)}")
+
+    st.subheader("Offers by Category")
+    for category in sorted({offer[0] for offer in offers}):
+        category_offers = [offer for offer in offers if offer[0] == category]
+        st.write(f"**{category}** ({len(category_offers)})")
+        df = pd.DataFrame([{
+            "Initial Offer #": offer[1],
+            "Revisions": offer[2],
+            "Latest Status": offer[4],
+            "Offered Value": offer[5],
+            "Last Follow-up": offer[6],
+            "Next Follow-up": offer[7]
+        } for offer in category_offers])
+        st.dataframe(df, use_container_width=True, hide_index=True)
+
+    replica = db.get_replica_status()
+    if replica:
+        st.caption(f"Read from the analytics replica, {replica['age_seconds']:.0f}s old.")
+
+
+if __name__ == "__main__":
+    st.set_page_config(page_title="CRM - Customer 360", layout="wide")
+    user = auth.require_login()
+    st.title("CRM - Customer 360")
+
+    customers = db.get_all_customers()
+    if not customers:
+        st.info("No customers found. Please add customers in Master Data.")
+        st.stop()
+
+    customer_name = st.selectbox("Customer", customers)
+    show_customer_contact(customer_name)
+    st.divider()
+    show_customer_offers(customer_name, auth.get_scope(user))
@@ -0,0 +1,98 @@
+import streamlit as st
+import pandas as pd
+import auth
+import database as db
+import dataquality
+
+def show_data_quality():
+    """Data-quality scanner"""
+    st.header("Data Quality")
+    st.write("Scans all leads for unknown employees, stale serial numbers, open leads "
+             "without a next follow-up date and gaps in offer revisions.")
+    
+    if st.button("🔍 Run Scan", type="primary"):
+        with st.spinner("Scanning leads..."):
+            st.session_state.dq_issues = dataquality.run_scan()
+    
+    issues = st.session_state.get("dq_issues")
+    if issues is None:
+        return
+    
+    summary = dataquality.summarize(issues)
+    cols = st.columns(len(summary))
+    for col, (name, count) in zip(cols, summary.items()):
+        with col:
+            st.metric(name.replace("_", " ").title(), count)
+    
+    if not issues:
+        st.success("No issues found")
+        return
+    
+    selected_check = st.selectbox(
+        "Show issues for",
+        [name for name, count in summary.items() if count],
+        format_func=lambda name: f"{name.replace('_', ' ').title()} - {dataquality.CHECKS[name][0]}"
+    )
+    check_issues = [issue for issue in issues if issue[0] == selected_check]
+    df = pd.DataFrame([{
+        "Lead ID": lead_id,
+        "Detail": detail,
+        "Fixable": "✅" if fix else ""
+    } for _, lead_id, detail, fix in check_issues[:1000]])
+    st.dataframe(df, use_container_width=True, hide_index=True)
+    if len(check_issues) > 1000:
+        st.caption(f"Showing 1,000 of {len(check_issues):,} issues; download the report for all of them.")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("⬇️ Download Report (CSV)", dataquality.build_report(issues),
+                           file_name="data_quality_report.csv", mime="text/csv")
+    with col2:
+        st.download_button("⬇️ Download Fix Script (SQL)", dataquality.build_fix_script(issues),
+                           file_name="data_quality_fixes.sql", mime="application/sql")
+
+
+def show_maintenance():
+    """Archive and snapshot jobs"""
+    st.header("Maintenance")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.subheader("Archive Closed Leads")
+        days = st.number_input("Closed and untouched for at least (days)", min_value=0,
+                               value=db.ARCHIVE_AFTER_DAYS)
+        if st.button("📦 Archive"):
+            success, message = db.archive_closed_leads(days)
+            if success:
+                st.success(message)
+            else:
+                st.error(message)
+    
+    with col2:
+        st.subheader("Pipeline Checkpoint")
+        st.write("Checkpoints speed up the dashboard's \"Pipeline as of\" view.")
+        if st.button("📸 Take Checkpoint"):
+            success, message = db.take_pipeline_checkpoint()
+            if success:
+                st.success(message)
+            else:
+                st.error(message)
+
+
+if __name__ == "__main__":
+    st.set_page_config(page_title="CRM - Admin", layout="wide")
+    user = auth.require_login()
+    st.title("CRM - Administration")
+    
+    if not auth.is_admin(user):
+        st.error("This page is only available to administrators.")
+        st.stop()
+    
+    tab1, tab2 = st.tabs(["Data Quality", "Maintenance"])
+    
+    with tab1:
+        show_data_quality()
+    
+    with tab2:
+        show_maintenance()
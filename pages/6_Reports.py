@@ -0,0 +1,60 @@
+import os
+import time
+import streamlit as st
+import auth
+import database as db
+import reports
+
+def show_report_jobs(user):
+    """Display report-pack jobs with their progress and downloads"""
+    st.subheader("Report Packs")
+
+    jobs = db.get_report_jobs(requested_by=None if auth.is_admin(user) else user["username"])
+
+    if not jobs:
+        st.info("No report packs yet")
+        return False
+
+    running = False
+    for job_id, requested_by, status, progress, total, path, error, created_at, finished_at in jobs:
+        col1, col2, col3 = st.columns([2, 3, 2])
+        with col1:
+            st.write(f"**#{job_id}** - {created_at} UTC")
+            st.caption(f"Requested by {requested_by or '-'}")
+        with col2:
+            if status in ("queued", "running"):
+                running = True
+                st.progress(progress / total if total else 0.0, text=f"{status.title()} ({progress}/{total})")
+            elif status == "failed":
+                st.error(f"Failed: {error}")
+            else:
+                st.success(f"Done at {finished_at} UTC")
+        with col3:
+            if status == "done" and path and os.path.exists(path):
+                st.download_button("⬇️ Download", reports.read_report_pack(path),
+                                   file_name=os.path.basename(path), mime="application/zip",
+                                   key=f"download_report_{job_id}")
+    return running
+
+
+if __name__ == "__main__":
+    st.set_page_config(page_title="CRM - Reports", layout="wide")
+    user = auth.require_login()
+    st.title("CRM - Reports")
+    st.write("A report pack holds lead summaries per category, sales person, customer and status "
+             "as CSV files plus an HTML overview, limited to the leads you can see. Packs are built "
+             "in the background; you can keep working while they run.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("📊 Generate Report Pack", type="primary"):
+            job_id = reports.submit_report_pack(user["username"], auth.get_scope(user))
+            st.success(f"Report pack #{job_id} queued")
+    with col2:
+        if st.button("🔄 Refresh"):
+            st.rerun()
+
+    running = show_report_jobs(user)
+    if running and st.checkbox("Refresh automatically while packs are being built", value=True):
+        time.sleep(2)
+        st.rerun()
@@ -0,0 +1,294 @@
+"""EXPLAIN QUERY PLAN regression check for the data layer.
+
+Runs every public function in database.py against a generated database,
+records each SQL statement it issues and fails (exit status 1) when a
+statement scans a table without an index or sorts through a temporary
+B-tree. It also times each call at several table sizes so plan regressions
+show up as numbers as well.
+
+Usage:
+    python plancheck.py                    # check plans on 20k leads
+    python plancheck.py --sizes 5000 20000 80000
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import database as db
+from sample_data import generate_sample_database
+
+# Plan steps that are expected, as (workload call or "*", step substring,
+# reason). Keep this list short; every entry needs a reason.
+ALLOWED = [
+    ("*", "SCAN table_versions", "one row per tracked table"),
+    ("*", "temp.archiving", "the archive job's own list of ids being moved"),
+    ("get_all_leads(archive)", "SCAN", "the full history listing reads every row of both files"),
+    ("get_all_leads(archive)", "USE TEMP B-TREE FOR ORDER BY", "merging hot and archived leads"),
+    ("get_leads_by_status(archive)", "USE TEMP B-TREE FOR ORDER BY", "merging hot and archived leads"),
+    ("get_customer_offer_summary(archive)", "USE TEMP B-TREE FOR GROUP BY", "grouping one customer's hot and archived rows"),
+    ("search_leads(archive)", "USE TEMP B-TREE FOR ORDER BY", "merging hot and archived leads"),
+    ("search_leads(value, archive)", "SCAN", "no index on offered_value; like the full history listing"),
+    ("search_leads(value, archive)", "USE TEMP B-TREE FOR ORDER BY", "merging hot and archived leads"),
+    ("get_all_leads(rep, archive)", "USE TEMP B-TREE FOR ORDER BY", "merging the rep's hot and archived leads"),
+    ("get_leads_by_status(rep, archive)", "USE TEMP B-TREE FOR ORDER BY", "merging the rep's hot and archived leads"),
+    ("search_leads(rep, archive)", "USE TEMP B-TREE FOR ORDER BY", "merging the rep's hot and archived leads"),
+    ("search_lead_options(id)", "USE TEMP B-TREE FOR ORDER BY", "sorts at most one row"),
+    ("search_lead_options(customer)", "USE TEMP B-TREE FOR ORDER BY", "sorts only the matching customers' leads"),
+    ("search_lead_options(rep)", "USE TEMP B-TREE FOR ORDER BY", "sorts only the matching customers' leads"),
+    ("search_lead_options(archive)", "SCAN", "picks from the full history listing, which reads both files anyway"),
+    ("search_lead_options(archive)", "USE TEMP B-TREE FOR ORDER BY", "merging hot and archived leads"),
+    ("search_lead_options(archived id)", "USE TEMP B-TREE FOR ORDER BY", "sorts at most one row per file"),
+    ("get_report_jobs", "SCAN report_jobs", "reads the newest jobs backwards by id and stops at the limit"),
+    ("refresh_lead_scores", "SCAN", "the daily score refresh rewrites every open lead's score"),
+    ("refresh_lead_scores", "USE TEMP B-TREE FOR GROUP BY", "win rates group hot and archived leads by category"),
+    ("get_lead_status_counts(rep)", "USE TEMP B-TREE FOR GROUP BY", "groups only the rep's rows found by the OR'd indexes"),
+    ("get_all_leads(rep)", "USE TEMP B-TREE FOR ORDER BY", "sorts only the rep's rows found by the OR'd indexes"),
+]
+
+# Temp tables the data layer creates inside a transaction; recreated empty so
+# that statements using them can be explained on a fresh connection
+TEMP_TABLES = {
+    "temp.archiving": "CREATE TEMP TABLE archiving (id INTEGER)",
+}
+
+BAD_PLAN_STEPS = [
+    (re.compile(r"^SCAN (?!.*USING (COVERING )?INDEX)(?!CONSTANT ROW)"), "full table scan"),
+    (re.compile(r"USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)"), "temp B-tree sort"),
+]
+
+
+def build_workload():
+    """Get (name, callable) pairs covering every query the data layer issues"""
+    today = date.today()
+    customer = db.get_all_customers()[0]
+    employee = db.get_all_employees()[0]
+    lead_id = db.get_all_leads()[0][0]
+    rep_scope = db.get_visibility_scope("rep", employee)
+    # main() archives old closed offers first; the oldest listed lead is one of them
+    archived_id = next(lead[0] for lead in reversed(db.get_all_leads(include_archive=True))
+                       if db.is_archived_lead(lead[0]))
+
+    def add_and_revise_lead():
+        customer_id = db.get_customer_id(customer)
+        offer_number = db.get_next_initial_offer_number(customer, "EPC")
+        revision = db.get_next_offer_revision_number(customer, "EPC", offer_number)
+        db.add_lead(customer_id, "EPC", employee, today, employee, "Plan check", "Price Offered",
+                    offer_number, revision, 1000.0, "P-2", employee, "", today, today + timedelta(days=7))
+        db.revise_lead(lead_id)
+
+    def lead_attachments():
+        db.add_lead_attachment(lead_id, "0" * 64, "offer.pdf", 1024, "application/pdf")
+        attachment_id = db.get_lead_attachments(lead_id)[0][0]
+        db.get_attachment(attachment_id)
+        db.delete_lead_attachment(attachment_id)
+        db.is_attachment_file_used("0" * 64)
+
+    def report_jobs():
+        job_id = db.add_report_job("plancheck", total=4)
+        db.update_report_job(job_id, status="done", progress=4, path="report_pack.zip")
+
+    def saved_views():
+        db.save_view("plancheck", "Big offers", {"min_value": 1_000_000})
+        db.get_saved_views("plancheck")
+        db.delete_saved_view("plancheck", "Big offers")
+
+    return [
+        ("get_all_employees", db.get_all_employees),
+        ("get_all_customers", db.get_all_customers),
+        ("get_customer_id", lambda: db.get_customer_id(customer)),
+        ("get_customer_details", lambda: db.get_customer_details(customer)),
+        ("get_lead_status_counts", db.get_lead_status_counts),
+        ("get_lead_status_counts(rep)", lambda: db.get_lead_status_counts(scope=rep_scope)),
+        ("get_lead_status_counts(archive)", lambda: db.get_lead_status_counts(include_archive=True)),
+        ("get_customer_offer_summary", lambda: db.get_customer_offer_summary(db.get_customer_id(customer))),
+        ("get_customer_offer_summary(rep)",
+         lambda: db.get_customer_offer_summary(db.get_customer_id(customer), scope=rep_scope)),
+        ("get_customer_offer_summary(archive)",
+         lambda: db.get_customer_offer_summary(db.get_customer_id(customer), include_archive=True)),
+        ("update_customer", lambda: db.update_customer(customer, "Plan check")),
+        ("add_employee", lambda: db.add_employee(f"Plan check {time.time()}")),
+        ("get_all_leads", db.get_all_leads),
+        ("get_all_leads(revisions)", lambda: db.get_all_leads(include_revisions=True)),
+        ("get_all_leads(archive)", lambda: db.get_all_leads(include_archive=True)),
+        ("get_all_leads(rep, archive)", lambda: db.get_all_leads(include_archive=True, scope=rep_scope)),
+        ("get_lead_by_id", lambda: db.get_lead_by_id(lead_id)),
+        ("search_lead_options", db.search_lead_options),
+        ("search_lead_options(id)", lambda: db.search_lead_options(str(lead_id))),
+        ("search_lead_options(customer)", lambda: db.search_lead_options(customer[-3:])),
+        ("search_lead_options(rep)", lambda: db.search_lead_options(customer[-3:], scope=rep_scope)),
+        ("search_lead_options(archive)",
+         lambda: db.search_lead_options(customer[-3:], include_revisions=True, include_archive=True)),
+        ("search_lead_options(archived id)", lambda: db.search_lead_options(str(archived_id), scope=rep_scope)),
+        ("is_archived_lead", lambda: db.is_archived_lead(lead_id)),
+        ("get_offer_revisions", lambda: db.get_offer_revisions(lead_id)),
+        ("get_leads_by_status", lambda: db.get_leads_by_status("Price Offered")),
+        ("get_leads_by_status(archive)", lambda: db.get_leads_by_status("Won", include_archive=True)),
+        ("get_leads_by_status(rep, archive)",
+         lambda: db.get_leads_by_status("Won", include_archive=True, scope=rep_scope)),
+        ("search_leads", lambda: db.search_leads({"statuses": ["Price Offered"], "categories": ["EPC"],
+                                                  "min_value": 1_000_000, "offer_from": today - timedelta(days=365)},
+                                                 limit=1000)),
+        ("search_leads(statuses)", lambda: db.search_leads({"statuses": ["Won", "Completed"]}, limit=1000)),
+        ("search_leads(overdue)", lambda: db.search_leads({"overdue": True}, today, limit=1000)),
+        ("search_leads(rep)", lambda: db.search_leads({"sales_persons": [employee]}, scope=rep_scope)),
+        ("search_leads(archive)", lambda: db.search_leads({"statuses": ["Won"]}, include_archive=True)),
+        ("search_leads(value, archive)",
+         lambda: db.search_leads({"min_value": 1_000_000, "max_value": 5_000_000}, include_archive=True)),
+        ("search_leads(rep, archive)",
+         lambda: db.search_leads({"statuses": ["Won"]}, include_archive=True, scope=rep_scope)),
+        ("saved views", saved_views),
+        ("report jobs", report_jobs),
+        ("get_report_jobs", db.get_report_jobs),
+        ("get_report_jobs(user)", lambda: db.get_report_jobs(requested_by="plancheck")),
+        ("get_followup_digest_leads", lambda: db.get_followup_digest_leads(today)),
+        ("reminder digests sent", lambda: (db.record_sent_digests(today, [(employee, 1)]),
+                                           db.get_sent_digests(today))),
+        ("get_leads_needing_followup", lambda: db.get_leads_needing_followup(today)),
+        ("get_all_leads(rep)", lambda: db.get_all_leads(scope=rep_scope)),
+        ("get_leads_by_status(rep)", lambda: db.get_leads_by_status("Price Offered", scope=rep_scope)),
+        ("get_leads_needing_followup(rep)", lambda: db.get_leads_needing_followup(today, scope=rep_scope)),
+        ("get_lead_by_id(rep)", lambda: db.get_lead_by_id(lead_id, scope=rep_scope)),
+        ("get_visibility_scope(team_lead)", lambda: db.get_visibility_scope("team_lead", employee)),
+        ("update_lead", lambda: db.update_lead(lead_id, priority="P-1")),
+        ("add_lead + revise_lead", add_and_revise_lead),
+        ("lead attachments", lead_attachments),
+        ("archive_closed_leads", lambda: db.archive_closed_leads(365)),
+        ("get_lead_changes", lambda: db.get_lead_changes(0, 500)),
+        ("take_pipeline_checkpoint", db.take_pipeline_checkpoint),
+        ("refresh_lead_scores", db.refresh_lead_scores),
+        ("get_rep_work_queue", lambda: db.get_rep_work_queue(employee)),
+        ("get_pipeline_as_of", lambda: db.get_pipeline_as_of(today - timedelta(days=90))),
+        ("prune_lead_changes", lambda: db.prune_lead_changes(0)),
+    ]
+
+
+def capture_statements(func):
+    """Run func with SQL tracing on every connection; return the statements it issued"""
+    statements = []
+    original = db.get_connection
+
+    def traced_connection(*args, **kwargs):
+        conn = original(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    db.get_connection = traced_connection
+    try:
+        db.clear_query_cache()
+        func()
+    finally:
+        db.get_connection = original
+    return statements
+
+
+def explain(statement):
+    """Get the EXPLAIN QUERY PLAN detail lines for a statement.
+
+    Scans of subquery results (co-routines and materialized views) are left
+    out; their underlying tables show up as separate steps.
+    """
+    conn = db.get_connection()
+    db._attach_archive(conn)
+    conn.create_function("lead_score", 6, db.compute_lead_score)
+    for name, ddl in TEMP_TABLES.items():
+        if name in statement and not statement.lstrip().upper().startswith("CREATE"):
+            conn.execute(ddl)
+    try:
+        steps = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {statement}')]
+    finally:
+        conn.close()
+
+    subqueries = {step.split()[-1] for step in steps if step.startswith(("CO-ROUTINE", "MATERIALIZE"))}
+    return [step for step in steps if not (step.startswith("SCAN ") and step.split()[1] in subqueries)]
+
+
+def is_checked(statement):
+    """Only DML and queries have plans worth checking"""
+    keyword = statement.lstrip().split(None, 1)[0].upper()
+    return keyword in ("SELECT", "INSERT", "UPDATE", "DELETE", "CREATE") and not statement.lstrip().upper().startswith(
+        ("CREATE TABLE IF NOT EXISTS", "CREATE INDEX", "CREATE TRIGGER", "CREATE VIEW"))
+
+
+def check_plans(workload):
+    """Return (name, statement, plan step, problem) for every bad plan in the workload"""
+    failures = []
+    for name, func in workload:
+        for statement in capture_statements(func):
+            if not is_checked(statement):
+                continue
+            for step in explain(statement):
+                for pattern, problem in BAD_PLAN_STEPS:
+                    if not pattern.search(step):
+                        continue
+                    if any(call in ("*", name) and allowed_step in step for call, allowed_step, _ in ALLOWED):
+                        continue
+                    failures.append((name, statement, step, problem))
+    return failures
+
+
+def time_workload(workload, repeat=5):
+    """Get the best-of-repeat uncached time of each call in milliseconds"""
+    timings = {}
+    for name, func in workload:
+        best = None
+        for _ in range(repeat):
+            db.clear_query_cache()
+            started = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the data layer's query plans")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000],
+                        help="Lead counts to generate; plans are checked on the largest")
+    args = parser.parse_args(argv)
+
+    sizes = sorted(args.sizes)
+    timings = {}
+    failures = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in sizes:
+            db_path = os.path.join(tmpdir, f"plancheck_{size}.db")
+            generate_sample_database(db_path, n_leads=size)
+            db.DB_PATH = db_path
+            db.ensure_database()
+            # Put some closed offers in the archive so the archive paths have data
+            db.archive_closed_leads(180)
+
+            workload = build_workload()
+            if size == sizes[-1]:
+                failures = check_plans(workload)
+            timings[size] = time_workload(workload)
+
+    header = f"{'call':<32}" + "".join(f"{f'{size} rows':>14}" for size in sizes)
+    if len(sizes) > 1:
+        header += f"{'growth':>10}"
+    print(header)
+    for name in timings[sizes[0]]:
+        line = f"{name:<32}" + "".join(f"{timings[size][name]:>12.2f}ms" for size in sizes)
+        if len(sizes) > 1:
+            # Time growth relative to row growth: ~1.0 means linear in table size
+            growth = (timings[sizes[-1]][name] / max(timings[sizes[0]][name], 1e-6)) / (sizes[-1] / sizes[0])
+            line += f"{growth:>10.2f}"
+        print(line)
+
+    if failures:
+        print(f"\n{len(failures)} plan regressions:")
+        for name, statement, step, problem in failures:
+            print(f"\n[{name}] {problem}: {step}\n    {' '.join(statement.split())}")
+        return 1
+
+    print("\nAll query plans use indexes.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
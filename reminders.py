@@ -0,0 +1,126 @@
+"""Daily follow-up reminder digests by email.
+
+Each run reads every open lead due for follow-up in one query, groups the
+leads by the person who has to follow up and sends each person a single
+digest. All digests go out over one SMTP connection; sent digests are
+recorded in batches in reminder_digests_sent, so running the job again on
+the same day only sends what is still missing.
+
+Configuration (environment):
+    CRM_SMTP_HOST, CRM_SMTP_PORT     SMTP server (default localhost:25)
+    CRM_SMTP_USER, CRM_SMTP_PASSWORD login, if the server needs one
+    CRM_SMTP_STARTTLS                "1" to upgrade the connection with STARTTLS
+    CRM_MAIL_FROM                    sender address
+
+Usage:
+    python manage.py reminders [--dry-run] [--date 2024-05-01]
+"""
+import os
+import smtplib
+from datetime import datetime
+from email.message import EmailMessage
+
+import database as db
+
+SMTP_HOST = os.environ.get("CRM_SMTP_HOST", "localhost")
+SMTP_PORT = int(os.environ.get("CRM_SMTP_PORT", 25))
+SMTP_USER = os.environ.get("CRM_SMTP_USER")
+SMTP_PASSWORD = os.environ.get("CRM_SMTP_PASSWORD")
+SMTP_STARTTLS = os.environ.get("CRM_SMTP_STARTTLS") == "1"
+MAIL_FROM = os.environ.get("CRM_MAIL_FROM", "crm@localhost")
+# Digests sent between two writes to reminder_digests_sent
+BATCH_SIZE = 50
+
+
+def build_digests(today_date):
+    """Group due leads per person; return [(person, email, leads)] ordered by person"""
+    digests = {}
+    for person, email, *lead in db.get_followup_digest_leads(today_date):
+        digests.setdefault(person, (email, []))[1].append(lead)
+    return [(person, email, leads) for person, (email, leads) in sorted(digests.items())]
+
+
+def render_digest(person, email, leads, today_date):
+    """Get the digest email for one person"""
+    today = today_date.isoformat()
+    overdue = [lead_id for lead_id, customer, category, status, next_follow_up_date, follow_up_status in leads
+               if next_follow_up_date < today]
+    lines = [
+        f"Hello {person},",
+        "",
+        f"You have {len(leads)} lead(s) due for follow-up"
+        + (f", {len(overdue)} of them overdue." if overdue else "."),
+        "",
+    ]
+    for lead_id, customer, category, status, next_follow_up_date, follow_up_status in leads:
+        marker = "OVERDUE " if next_follow_up_date < today else ""
+        lines.append(f"- {marker}{next_follow_up_date}  #{lead_id} {customer} ({category}) - {status}")
+        if follow_up_status:
+            lines.append(f"    Last note: {follow_up_status}")
+    lines += ["", "Open the Lead Tracking page in the CRM to update these leads."]
+
+    message = EmailMessage()
+    message["Subject"] = f"CRM follow-ups for {today}: {len(leads)} due"
+    message["From"] = MAIL_FROM
+    message["To"] = email
+    message.set_content("\n".join(lines))
+    return message
+
+
+def open_smtp():
+    """Open the SMTP session used for a whole run"""
+    smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+    if SMTP_STARTTLS:
+        smtp.starttls()
+    if SMTP_USER:
+        smtp.login(SMTP_USER, SMTP_PASSWORD or "")
+    return smtp
+
+
+def send_reminders(today_date=None, dry_run=False, batch_size=BATCH_SIZE, smtp_factory=open_smtp):
+    """Send today's digests that have not been sent yet; return (sent, skipped, failed) person lists.
+
+    skipped holds people without an email address; failed holds
+    (person, error) for digests the server refused.
+    """
+    today_date = today_date or datetime.now().date()
+    digest_date = today_date.isoformat()
+    already_sent = db.get_sent_digests(digest_date)
+    digests = [digest for digest in build_digests(today_date) if digest[0] not in already_sent]
+
+    sent, skipped, failed = [], [], []
+    pending = []
+    smtp = None
+    try:
+        for person, email, leads in digests:
+            if not email:
+                skipped.append(person)
+                continue
+            message = render_digest(person, email, leads, today_date)
+            if dry_run:
+                print(message)
+                sent.append(person)
+                continue
+
+            if smtp is None:
+                smtp = smtp_factory()
+            try:
+                smtp.send_message(message)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as e:
+                failed.append((person, str(e)))
+                continue
+            sent.append(person)
+            pending.append((person, len(leads)))
+            if len(pending) >= batch_size:
+                db.record_sent_digests(digest_date, pending)
+                pending = []
+    finally:
+        # Record what went out even if the connection drops half way
+        if pending:
+            db.record_sent_digests(digest_date, pending)
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except smtplib.SMTPException:
+                pass
+    return sent, skipped, failed
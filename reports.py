@@ -0,0 +1,188 @@
+"""Weekly report packs built in the background.
+
+A report pack is a zip of CSV summaries (per category, sales person, customer
+and status) plus an HTML page showing all of them. Packs are built in a
+process pool from a snapshot copy of the database taken with SQLite's backup
+API, so a long report neither blocks the Streamlit session that asked for it
+nor holds a read transaction open on the live database. Progress is recorded
+in the report_jobs table, which the Reports page polls.
+
+Usage:
+    python manage.py report [--output-dir reports]
+"""
+import csv
+import html
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import database as db
+
+REPORT_DIR = os.environ.get("CRM_REPORT_DIR", "reports")
+REPORT_WORKERS = int(os.environ.get("CRM_REPORT_WORKERS", 1))
+# Report workers run at a lower CPU priority than the Streamlit server
+REPORT_NICENESS = 10
+
+_METRICS = '''COUNT(*) AS "Offers",
+              SUM(l.status NOT IN ('Won', 'Lost', 'Completed')) AS "Open",
+              SUM(l.status IN ('Won', 'Completed')) AS "Won",
+              SUM(l.status = 'Lost') AS "Lost",
+              ROUND(COALESCE(SUM(l.offered_value), 0), 2) AS "Offered Value",
+              ROUND(COALESCE(SUM(CASE WHEN l.status IN ('Won', 'Completed') THEN l.offered_value END), 0), 2)
+                  AS "Won Value",
+              SUM(l.status NOT IN ('Won', 'Lost', 'Completed') AND l.next_follow_up_date < date('now', 'localtime'))
+                  AS "Overdue Follow-ups"'''
+
+# Each report is (file name, title, query) over the latest revision of each
+# offer; {scope} is replaced by the visibility condition.
+REPORTS = [
+    ("by_category.csv", "Offers by Category",
+     f'''SELECT l.project_category AS "Category", {_METRICS}
+         FROM latest_leads l
+         WHERE {{scope}}
+         GROUP BY l.project_category
+         ORDER BY l.project_category'''),
+    ("by_sales_person.csv", "Offers by Sales Person",
+     f'''SELECT l.assigned_sales_person AS "Sales Person", e.team AS "Team", {_METRICS}
+         FROM latest_leads l
+         LEFT JOIN employees e ON e.name = l.assigned_sales_person
+         WHERE {{scope}}
+         GROUP BY l.assigned_sales_person
+         ORDER BY l.assigned_sales_person'''),
+    ("by_customer.csv", "Offers by Customer",
+     f'''SELECT c.name AS "Customer", c.contact_person AS "Contact Person", {_METRICS},
+                MAX(l.follow_up_date) AS "Last Follow-up"
+         FROM latest_leads l
+         JOIN customers c ON c.id = l.customer_id
+         WHERE {{scope}}
+         GROUP BY c.id
+         ORDER BY c.name'''),
+    ("by_status.csv", "Pipeline by Status",
+     '''SELECT l.status AS "Status", COUNT(*) AS "Offers",
+               ROUND(COALESCE(SUM(l.offered_value), 0), 2) AS "Offered Value"
+        FROM latest_leads l
+        WHERE {scope}
+        GROUP BY l.status
+        ORDER BY l.status'''),
+]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def snapshot_database(db_path, snapshot_path):
+    """Copy the database to snapshot_path with the online backup API"""
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(snapshot_path)
+    try:
+        # Copy in steps so writers are only held off for a few pages at a time
+        source.backup(target, pages=1024)
+    finally:
+        target.close()
+        source.close()
+
+
+def build_report(conn, query, scope=None):
+    """Run one report query; return (column names, rows)"""
+    scope_condition, scope_params = db._scope_condition(scope)
+    cursor = conn.execute(query.format(scope=scope_condition), scope_params)
+    return [column[0] for column in cursor.description], cursor.fetchall()
+
+
+def write_csv(columns, rows):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return output.getvalue()
+
+
+def write_html(sections, generated_at):
+    """Get one HTML page with a table per report"""
+    parts = [f"<html><head><meta charset='utf-8'><title>CRM Report Pack</title></head><body>",
+             f"<h1>CRM Report Pack</h1><p>Generated {html.escape(generated_at)}</p>"]
+    for title, columns, rows in sections:
+        parts.append(f"<h2>{html.escape(title)}</h2><table border='1' cellspacing='0' cellpadding='4'><tr>")
+        parts.extend(f"<th>{html.escape(str(column))}</th>" for column in columns)
+        parts.append("</tr>")
+        for row in rows:
+            parts.append("<tr>" + "".join(f"<td>{html.escape(str(value if value is not None else ''))}</td>"
+                                          for value in row) + "</tr>")
+        parts.append("</table>")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def generate_report_pack(tenant, job_id, scope=None, report_dir=REPORT_DIR):
+    """Build a report pack from a snapshot of the tenant's database; runs inside a worker process"""
+    # A worker is forked from whichever session first submitted a job, so it
+    # inherits that session's tenant; route this job to its own one.
+    db.set_tenant(tenant)
+    db_path = db.get_db_path()
+    try:
+        db.update_report_job(job_id, status="running")
+        os.makedirs(report_dir, exist_ok=True)
+        generated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        pack_path = os.path.join(report_dir, f"report_pack_{job_id}.zip")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            snapshot_path = os.path.join(tmpdir, "snapshot.db")
+            snapshot_database(db_path, snapshot_path)
+            conn = sqlite3.connect(f"file:{snapshot_path}?mode=ro", uri=True)
+            sections = []
+            try:
+                tmp_pack_path = f"{pack_path}.tmp"
+                with zipfile.ZipFile(tmp_pack_path, "w", zipfile.ZIP_DEFLATED) as pack:
+                    for done, (filename, title, query) in enumerate(REPORTS, 1):
+                        columns, rows = build_report(conn, query, scope)
+                        pack.writestr(filename, write_csv(columns, rows))
+                        sections.append((title, columns, rows))
+                        db.update_report_job(job_id, progress=done)
+                    pack.writestr("index.html", write_html(sections, generated_at))
+                os.replace(tmp_pack_path, pack_path)
+            finally:
+                conn.close()
+
+        db.update_report_job(job_id, status="done", progress=len(REPORTS), path=pack_path)
+        return pack_path
+    except Exception as e:
+        db.update_report_job(job_id, status="failed", error=str(e))
+        raise
+
+
+def get_report_dir():
+    """Get the report directory of the current business unit"""
+    tenant = db.get_tenant()
+    return os.path.join(REPORT_DIR, tenant) if tenant else REPORT_DIR
+
+
+def _init_worker():
+    """Lower a new worker's CPU priority once; os.nice() adds up on every call"""
+    if hasattr(os, "nice"):
+        os.nice(REPORT_NICENESS)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=REPORT_WORKERS, initializer=_init_worker)
+        return _executor
+
+
+def submit_report_pack(requested_by=None, scope=None):
+    """Queue a report pack in the background pool; return the job id"""
+    job_id = db.add_report_job(requested_by, total=len(REPORTS))
+    _get_executor().submit(generate_report_pack, db.get_tenant(), job_id, scope, get_report_dir())
+    return job_id
+
+
+def read_report_pack(path):
+    """Get the bytes of a finished report pack"""
+    with open(path, "rb") as f:
+        return f.read()
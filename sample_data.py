@@ -0,0 +1,123 @@
+"""Generate a populated CRM database for load tests and query-plan checks.
+
+Usage:
+    python sample_data.py sample.db --leads 50000
+"""
+import argparse
+import os
+import random
+import sqlite3
+from datetime import date, timedelta
+
+import database as db
+
+STATUSES = ["Connected", "Technical Analysis", "Price Offered", "Won", "Completed", "Lost"]
+STATUS_WEIGHTS = [25, 15, 25, 15, 5, 15]
+PRIORITIES = ["P-1", "P-2", "P-3", "P-4"]
+
+
+def generate_sample_database(path, n_leads=20000, n_customers=500, n_employees=40, seed=0):
+    """Create a fresh database at path filled with random but realistic data"""
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+
+    previous_path = db.DB_PATH
+    db.DB_PATH = path
+    try:
+        db.init_database()
+    finally:
+        db.DB_PATH = previous_path
+
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+
+    employees = [f"Employee {i}" for i in range(1, n_employees + 1)]
+    cursor.executemany(
+        'INSERT INTO employees (name, email, phone) VALUES (?, ?, ?)',
+        [(name, f"employee{i}@example.com", f"+880-1700-{i:06d}") for i, name in enumerate(employees, 1)]
+    )
+    cursor.executemany(
+        'INSERT INTO customers (name, contact_person, email, phone, address) VALUES (?, ?, ?, ?, ?)',
+        [(f"Customer {i}", f"Contact {i}", f"customer{i}@example.com", f"+880-1800-{i:06d}", f"Road {i}, Dhaka")
+         for i in range(1, n_customers + 1)]
+    )
+
+    categories = db.get_all_project_categories()
+    today = date.today()
+    next_offer = {}
+    rows = []
+    while len(rows) < n_leads:
+        customer_id = rng.randint(1, n_customers)
+        category = rng.choice(categories)
+        offer_number = next_offer.get((customer_id, category), 0) + 1
+        next_offer[(customer_id, category)] = offer_number
+
+        sales_person = rng.choice(employees)
+        offer_created = today - timedelta(days=rng.randint(0, 730))
+        revisions = rng.choices([1, 2, 3], weights=[70, 20, 10])[0]
+        for revision in range(1, revisions + 1):
+            status = rng.choices(STATUSES, weights=STATUS_WEIGHTS)[0]
+            created = offer_created + timedelta(days=7 * (revision - 1))
+            follow_up = created + timedelta(days=rng.randint(0, 14))
+            next_follow_up = follow_up + timedelta(days=rng.randint(-30, 30))
+            serial = None
+            if status != "Connected" and status != "Technical Analysis":
+                serial = db.generate_serial_number(
+                    category, f"Customer {customer_id}", created, offer_number, f"R{revision}"
+                )
+            rows.append((
+                customer_id, category, sales_person, created.isoformat(), rng.choice(employees),
+                f"Scope of work {len(rows)}", status, offer_number, f"R{revision}",
+                round(rng.uniform(50_000, 50_000_000), 2), rng.choice(PRIORITIES),
+                rng.choice([sales_person, rng.choice(employees)]), "Called customer",
+                follow_up.isoformat(), next_follow_up.isoformat(), serial,
+                f"{created.isoformat()} 10:00:00", f"{follow_up.isoformat()} 10:00:00",
+                revision, int(revision == revisions)
+            ))
+
+    cursor.executemany(
+        '''INSERT INTO leads (customer_id, project_category, assigned_sales_person, offer_created,
+                             lead_through, scope_of_work, status, initial_offer_number,
+                             offer_revision_number, offered_value, priority, follow_up_by,
+                             follow_up_status, follow_up_date, next_follow_up_date, serial_number,
+                             created_at, updated_at, revision, is_latest)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        rows
+    )
+    # Link each revision to the one before it
+    cursor.execute(
+        '''UPDATE leads SET parent_lead_id = (
+               SELECT p.id FROM leads p
+               WHERE p.customer_id = leads.customer_id
+               AND p.project_category = leads.project_category
+               AND p.initial_offer_number = leads.initial_offer_number
+               AND p.revision = leads.revision - 1)
+           WHERE revision > 1'''
+    )
+    # Date the pipeline history at each lead's creation rather than now
+    cursor.execute(
+        '''UPDATE lead_history SET changed_at = (
+               SELECT created_at FROM leads WHERE leads.id = lead_history.lead_id)'''
+    )
+    conn.commit()
+    cursor.execute('ANALYZE')
+    conn.close()
+    return len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a sample CRM database")
+    parser.add_argument("path", help="Database file to create (overwritten if it exists)")
+    parser.add_argument("--leads", type=int, default=20000)
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--employees", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    count = generate_sample_database(args.path, args.leads, args.customers, args.employees, args.seed)
+    print(f"Wrote {count} leads to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
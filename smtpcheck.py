@@ -0,0 +1,159 @@
+"""Check the follow-up reminder job against a local SMTP stand-in.
+
+Generates a sample database, starts a minimal SMTP server on localhost in a
+background thread and runs reminders.send_reminders() against it. It fails
+(exit status 1) unless every digest arrives over a single connection, each
+digest counts the same due and overdue leads as the database, people without
+an email address are skipped and a second run on the same day sends nothing.
+
+Usage:
+    python smtpcheck.py
+    python smtpcheck.py --leads 20000
+"""
+import argparse
+import os
+import re
+import socketserver
+import sqlite3
+import sys
+import tempfile
+import threading
+from datetime import date
+from email import message_from_bytes, policy
+
+import database as db
+import reminders
+from sample_data import generate_sample_database
+
+DIGEST_COUNTS = re.compile(r"You have (\d+) lead\(s\) due for follow-up(?:, (\d+) of them overdue)?")
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Just enough of an SMTP server to accept messages and keep them"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.lock = threading.Lock()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply("220 smtpcheck ready")
+        data = None
+        for raw_line in self.rfile:
+            line = raw_line.rstrip(b"\r\n")
+            if data is not None:
+                if line == b".":
+                    with self.server.lock:
+                        self.server.messages.append(message_from_bytes(b"\r\n".join(data), policy=policy.default))
+                    data = None
+                    self.reply("250 OK")
+                else:
+                    # Undo the sender's dot-stuffing
+                    data.append(line[1:] if line.startswith(b".") else line)
+                continue
+
+            command = line.split(b" ", 1)[0].upper()
+            if command == b"DATA":
+                data = []
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+def prepare_database(db_path, n_leads):
+    """Generate a database whose digests cover notes left empty and people without an email"""
+    generate_sample_database(db_path, n_leads=n_leads)
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE leads SET follow_up_status = NULL WHERE id % 3 = 0")
+    conn.execute("UPDATE employees SET email = '' WHERE id = 1")
+    conn.commit()
+    conn.close()
+
+
+def expected_digests(today_date):
+    """Get {email: (due, overdue)} straight from the database"""
+    expected = {}
+    for person, email, lead_id, customer, category, status, next_follow_up_date, follow_up_status in \
+            db.get_followup_digest_leads(today_date):
+        if email:
+            due, overdue = expected.get(email, (0, 0))
+            expected[email] = (due + 1, overdue + (next_follow_up_date < today_date.isoformat()))
+    return expected
+
+
+def check_digests(server, expected):
+    """Compare the messages the stand-in received with the database; return a list of problems"""
+    problems = []
+    if server.connections != 1:
+        problems.append(f"expected 1 SMTP connection, got {server.connections}")
+    received = {}
+    for message in server.messages:
+        match = DIGEST_COUNTS.search(message.get_content())
+        if not match:
+            problems.append(f"digest to {message['To']} has no lead counts")
+            continue
+        received[message["To"]] = (int(match.group(1)), int(match.group(2) or 0))
+    if len(server.messages) != len(expected):
+        problems.append(f"expected {len(expected)} digests, got {len(server.messages)}")
+    for email, counts in sorted(expected.items()):
+        if received.get(email) != counts:
+            problems.append(f"{email}: expected (due, overdue) {counts}, got {received.get(email)}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the reminder job against a local SMTP stand-in")
+    parser.add_argument("--leads", type=int, default=5000, help="Leads to generate")
+    args = parser.parse_args(argv)
+
+    today_date = date.today()
+    server = SMTPStandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    reminders.SMTP_HOST, reminders.SMTP_PORT = server.server_address
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db.DB_PATH = os.path.join(tmpdir, "smtpcheck.db")
+            prepare_database(db.DB_PATH, args.leads)
+            db.ensure_database()
+
+            expected = expected_digests(today_date)
+            sent, skipped, failed = reminders.send_reminders(today_date)
+            problems = check_digests(server, expected)
+            if failed:
+                problems.append(f"server refused digests for {', '.join(person for person, error in failed)}")
+            if skipped != ["Employee 1"]:
+                problems.append(f"expected only Employee 1 skipped, got {skipped}")
+
+            rerun_sent = reminders.send_reminders(today_date)[0]
+            if rerun_sent or len(server.messages) != len(expected):
+                problems.append(f"second run sent {len(rerun_sent)} digests again")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(f"{len(sent)} digests sent over {server.connections} SMTP connection(s), {len(skipped)} skipped")
+    if problems:
+        print(f"\n{len(problems)} problems:")
+        for problem in problems:
+            print(f"- {problem}")
+        return 1
+
+    print("\nAll digests match the database.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())